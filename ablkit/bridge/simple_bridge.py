@@ -5,6 +5,8 @@ Copyright (c) 2024 LAMDA.  All rights reserved.
 """
 
 import os.path as osp
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, List, Optional, Tuple, Union
 
 from numpy import ndarray
@@ -41,6 +43,15 @@ class SimpleBridge(BaseBridge):
         A list of metrics used for evaluating the model's performance.
     """
 
+    # Fields of data examples produced by the steps of training.
+    _derived_fields = (
+        "pred_idx",
+        "pred_prob",
+        "pred_pseudo_label",
+        "abduced_pseudo_label",
+        "abduced_idx",
+    )
+
     def __init__(
         self,
         model: ABLModel,
@@ -218,6 +229,8 @@ class SimpleBridge(BaseBridge):
         eval_interval: int = 1,
         save_interval: Optional[int] = None,
         save_dir: Optional[str] = None,
+        pipeline: bool = False,
+        max_staleness: int = 1,
     ):
         """
         A typical training pipeline of Abuductive Learning.
@@ -255,11 +268,27 @@ class SimpleBridge(BaseBridge):
             Defaults to None.
         save_dir : str, optional
             Directory to save the model. Defaults to None.
+        pipeline : bool
+            Whether to pipeline the segments within each loop. If True, the abduction of the
+            next segments runs in a background thread while the model is trained on the
+            current one, so the pseudo-labels of a segment may be predicted by a model that
+            has not been trained on the preceding segments yet. Defaults to False.
+        max_staleness : int
+            The maximum number of training steps the model used to predict a segment may lag
+            behind, i.e., the number of segments prefetched ahead of the one being trained,
+            when ``pipeline`` is True. Defaults to 1.
         """
         data_examples = self.data_preprocess("train", train_data)
 
         if label_data is not None:
+            # The labeled data examples are mapped to indices once, instead of per segment, on
+            # a view sharing their lists, so that ``label_data`` itself is left as it is.
             label_data_examples = self.data_preprocess("label", label_data)
+            label_data_examples = self._segment_view(
+                label_data_examples, 0, len(label_data_examples)
+            )
+            label_data_examples.abduced_pseudo_label = label_data_examples.gt_pseudo_label
+            self.pseudo_label_to_idx(label_data_examples)
         else:
             label_data_examples = None
 
@@ -279,24 +308,27 @@ class SimpleBridge(BaseBridge):
         else:
             raise ValueError("segment_size should be int or float.")
 
+        if pipeline and (not isinstance(max_staleness, int) or max_staleness <= 0):
+            raise ValueError("max_staleness should be a positive int.")
+
         for loop in range(loops):
-            for seg_idx in range((len(data_examples) - 1) // segment_size + 1):
-                print_log(
-                    f"loop(train) [{loop + 1}/{loops}] segment(train) "
-                    f"[{(seg_idx + 1)}/{(len(data_examples) - 1) // segment_size + 1}] ",
-                    logger="current",
+            if pipeline:
+                self._train_loop_pipelined(
+                    data_examples, label_data_examples, segment_size, loop, loops, max_staleness
                 )
-
-                sub_data_examples = data_examples[
-                    seg_idx * segment_size : (seg_idx + 1) * segment_size
-                ]
-                self.predict(sub_data_examples)
-                self.idx_to_pseudo_label(sub_data_examples)
-                self.abduce_pseudo_label(sub_data_examples)
-                self.filter_pseudo_label(sub_data_examples)
-                self.concat_data_examples(sub_data_examples, label_data_examples)
-                self.pseudo_label_to_idx(sub_data_examples)
-                self.model.train(sub_data_examples)
+            else:
+                for seg_idx in range((len(data_examples) - 1) // segment_size + 1):
+                    self._log_segment(data_examples, segment_size, seg_idx, loop, loops)
+                    sub_data_examples = self._segment_view(
+                        data_examples, seg_idx * segment_size, (seg_idx + 1) * segment_size
+                    )
+                    self.predict(sub_data_examples)
+                    self.idx_to_pseudo_label(sub_data_examples)
+                    self._abduce_segment(sub_data_examples)
+                    self._train_segment(sub_data_examples, label_data_examples)
+
+            self._log_cache_info(loop, loops)
+            self._log_zoopt_budget_info(loop, loops)
 
             if (loop + 1) % eval_interval == 0 or loop == loops - 1:
                 print_log(f"Eval start: loop(val) [{loop + 1}]", logger="current")
@@ -308,6 +340,168 @@ class SimpleBridge(BaseBridge):
                     save_path=osp.join(save_dir, f"model_checkpoint_loop_{loop + 1}.pth")
                 )
 
+    def _log_segment(
+        self, data_examples: ListData, segment_size: int, seg_idx: int, loop: int, loops: int
+    ) -> None:
+        """
+        Internal method for logging the progress of training on a segment.
+        """
+        print_log(
+            f"loop(train) [{loop + 1}/{loops}] segment(train) "
+            f"[{(seg_idx + 1)}/{(len(data_examples) - 1) // segment_size + 1}] ",
+            logger="current",
+        )
+
+    def _segment_view(self, data_examples: ListData, start: int, stop: int) -> ListData:
+        """
+        Internal method for getting a segment of the training data examples. Only the input
+        fields are taken, i.e., the fields produced during training (such as predictions
+        left by validation) are skipped, and the lists of the input fields are shared
+        rather than copied if the segment covers all data examples. The segment is never
+        modified in place afterwards, as each step assigns new lists to it.
+        """
+        segment = ListData(metainfo=data_examples.metainfo)
+        whole = start == 0 and stop >= len(data_examples)
+        for key, value in data_examples.items():
+            if key in self._derived_fields:
+                continue
+            segment[key] = value if value is None or whole else value[start:stop]
+        return segment
+
+    def _abduce_segment(self, sub_data_examples: ListData) -> ListData:
+        """
+        Internal method for abducing and filtering the pseudo-labels of a segment whose
+        pseudo-labels have been predicted.
+        """
+        self.abduce_pseudo_label(sub_data_examples)
+        self.filter_pseudo_label(sub_data_examples)
+        return sub_data_examples
+
+    def _train_segment(
+        self, sub_data_examples: ListData, label_data_examples: Optional[ListData]
+    ) -> None:
+        """
+        Internal method for training the model on a segment whose pseudo-labels have been
+        abduced, together with the labeled data examples (whose indices are mapped before
+        training). Unless ``concat_data_examples`` is overridden, the segment is left as it
+        is, and the model is trained on a new ``ListData`` whose lists concatenate those of
+        both parts. The concatenation still copies the references of the labeled lists for
+        each segment, but the labeled data examples are not mapped again.
+        """
+        if (
+            label_data_examples is None
+            or type(self).concat_data_examples is not SimpleBridge.concat_data_examples
+        ):
+            self.concat_data_examples(sub_data_examples, label_data_examples)
+            self.pseudo_label_to_idx(sub_data_examples)
+            self.model.train(sub_data_examples)
+            return
+        self.pseudo_label_to_idx(sub_data_examples)
+        union_data_examples = ListData(metainfo=sub_data_examples.metainfo)
+        for key in ["X", "abduced_pseudo_label", "abduced_idx", "Y"]:
+            union_data_examples[key] = sub_data_examples[key] + label_data_examples[key]
+        self.model.train(union_data_examples)
+
+    def _train_loop_pipelined(
+        self,
+        data_examples: ListData,
+        label_data_examples: Optional[ListData],
+        segment_size: int,
+        loop: int,
+        loops: int,
+        max_staleness: int,
+    ) -> None:
+        """
+        Internal method for one loop of training in which the segments are pipelined. Up to
+        ``max_staleness`` segments ahead of the one being trained are predicted by the
+        current model and abduced in a background thread, and the pipeline is drained at
+        the end of the loop.
+
+        Parameters
+        ----------
+        data_examples : ListData
+            Training data examples.
+        label_data_examples : ListData, optional
+            Labeled data examples, if available.
+        segment_size : int
+            Size of each segment.
+        loop : int
+            Index of the current loop.
+        loops : int
+            Total number of loops.
+        max_staleness : int
+            Maximum number of segments prefetched ahead of the one being trained.
+        """
+        seg_num = (len(data_examples) - 1) // segment_size + 1
+        pending = deque()
+        next_seg_idx = 0
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for seg_idx in range(seg_num):
+                while next_seg_idx < seg_num and len(pending) <= max_staleness:
+                    sub_data_examples = self._segment_view(
+                        data_examples,
+                        next_seg_idx * segment_size,
+                        (next_seg_idx + 1) * segment_size,
+                    )
+                    self.predict(sub_data_examples)
+                    self.idx_to_pseudo_label(sub_data_examples)
+                    pending.append(executor.submit(self._abduce_segment, sub_data_examples))
+                    next_seg_idx += 1
+                self._log_segment(data_examples, segment_size, seg_idx, loop, loops)
+                self._train_segment(pending.popleft().result(), label_data_examples)
+
+    def _log_cache_info(self, loop: int, loops: int) -> None:
+        """
+        Internal method for logging the statistics of the abduction cache of the knowledge
+        base, if the cache is used.
+
+        Parameters
+        ----------
+        loop : int
+            Index of the current loop.
+        loops : int
+            Total number of loops.
+        """
+        kb = self.reasoner.kb
+        if not getattr(kb, "use_cache", False):
+            return
+        for name, info in kb.cache_info().items():
+            lookups = info.hits + info.misses
+            hit_rate = info.hits / lookups if lookups else 0.0
+            print_log(
+                f"Cache stats: loop(train) [{loop + 1}/{loops}] {name} "
+                f"hits: {info.hits} misses: {info.misses} hit_rate: {hit_rate:.3f} "
+                f"disk_hits: {info.disk_hits} evictions: {info.evictions} "
+                f"size: {info.size}/{info.max_size} bytes: {info.bytes} "
+                f"time_saved: {info.time_saved:.3f}s",
+                logger="current",
+            )
+
+    def _log_zoopt_budget_info(self, loop: int, loops: int) -> None:
+        """
+        Internal method for logging how much of the ZOOpt budget has been used by the
+        reasoner in this loop, if the adaptive budget of ZOOpt is used.
+
+        Parameters
+        ----------
+        loop : int
+            Index of the current loop.
+        loops : int
+            Total number of loops.
+        """
+        reasoner = self.reasoner
+        if not (reasoner.use_zoopt and getattr(reasoner, "zoopt_adaptive_budget", False)):
+            return
+        info = reasoner.zoopt_budget_info(reset=True)
+        used = info["evaluations"] / info["budget"] if info["budget"] else 0.0
+        print_log(
+            f"ZOOpt stats: loop(train) [{loop + 1}/{loops}] "
+            f"optimizations: {info['optimizations']} evaluations: {info['evaluations']} "
+            f"budget: {info['budget']} budget_used: {used:.3f} "
+            f"early_stops: {info['early_stops']}",
+            logger="current",
+        )
+
     def _valid(self, data_examples: ListData) -> None:
         """
         Internal method for validating the model with given data examples.
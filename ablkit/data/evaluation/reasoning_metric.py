@@ -62,9 +62,7 @@ class ReasoningMetric(BaseMetric):
         y_list = data_examples.Y
         x_list = data_examples.X
         for pred_pseudo_label, y, x in zip(pred_pseudo_label_list, y_list, x_list):
-            if self.kb._check_equal(
-                self.kb.logic_forward(pred_pseudo_label, *(x,) if self.kb._num_args == 2 else ()), y
-            ):
+            if self.kb._check_equal(self.kb.cached_logic_forward(pred_pseudo_label, x), y):
                 self.results.append(1)
             else:
                 self.results.append(0)
@@ -5,21 +5,82 @@ for different kinds of knowledge bases.
 Copyright (c) 2024 LAMDA.  All rights reserved.
 """
 
-import bisect
+import hashlib
 import inspect
 import logging
+import numbers
 import os
+import shutil
+import tempfile
 from abc import ABC, abstractmethod
-from collections import defaultdict
 from itertools import combinations, product
-from multiprocessing import Pool
-from typing import Any, Callable, List, Optional
+from multiprocessing import Pool, current_process, get_context
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 
-from ..utils.cache import abl_cache
+from ..utils.cache import (
+    CacheInfo,
+    LogicForwardCache,
+    RevisionLevelCache,
+    abl_cache,
+    cache_infos,
+    clear_caches,
+    export_caches,
+    flush_caches,
+    import_caches,
+)
 from ..utils.logger import print_log
-from ..utils.utils import flatten, hamming_dist, reform_list, to_hashable
+from ..utils.utils import flatten, reform_list, to_hashable
+
+
+_GKB_worker_kb = None
+
+
+def _init_GKB_worker(kb):
+    """
+    Initialize a worker process used to build the GKB, so that the knowledge base is
+    transferred once per worker rather than once per task.
+    """
+    global _GKB_worker_kb  # pylint: disable=global-statement
+    _GKB_worker_kb = kb
+
+
+def _get_XY_chunk_in_worker(args):
+    return _GKB_worker_kb._get_XY_chunk(args)  # pylint: disable=protected-access
+
+
+_prolog_worker = None
+
+
+def _consult_prolog(pl_file, table_predicates=None):
+    """
+    Create a SWI-Prolog engine consulting ``pl_file``, with ``table_predicates`` tabled.
+    """
+    import pyswip  # pylint: disable=import-outside-toplevel
+
+    prolog = pyswip.Prolog()
+    prolog.consult(pl_file)
+    for predicate in table_predicates or []:
+        list(prolog.query(f"table({predicate})."))
+    return prolog
+
+
+def _init_prolog_worker(pl_file, table_predicates=None):
+    """
+    Initialize a worker process of PrologKB, which hosts its own SWI-Prolog engine
+    consulting ``pl_file``.
+    """
+    global _prolog_worker  # pylint: disable=global-statement
+    _prolog_worker = _consult_prolog(pl_file, table_predicates)
+
+
+def _query_in_prolog_worker(query_string):
+    # Nested atoms hold handles of the worker's engine, so plain values are sent back.
+    return [
+        {name: PrologKB._term_to_python(value) for name, value in solution.items()}
+        for solution in _prolog_worker.query(query_string)
+    ]
 
 
 class KBBase(ABC):
@@ -43,9 +104,44 @@ class KBBase(ABC):
     key_func : Callable, optional
         A function employed for hashing in abl_cache. This is only operational when use_cache
         is set to True. Defaults to ``to_hashable``.
+    x_key_func : Callable, optional
+        A function mapping the example ``x`` to a hashable key (e.g., a row id, a content hash
+        or a digest of the feature vector), which is added to the key of abl_cache. This is
+        required for caching when ``logic_forward`` takes ``x``, otherwise the cache is
+        disabled in that case. This is only operational when use_cache is set to True.
+        Defaults to None.
     cache_size: int, optional
         The cache size in abl_cache. This is only operational when use_cache is set to
         True. Defaults to 4096.
+    cache_file : str, optional
+        Path of an SQLite file used as a persistent tier under abl_cache, so that abduced
+        candidates survive across runs. Entries are keyed by a fingerprint of the KB (refer
+        to ``_get_fingerprint``), read from the file upon a miss of the in-memory cache, and
+        written back asynchronously. This is only operational when use_cache is set to True.
+        Defaults to None.
+    cache_file_size : int, optional
+        The maximum number of entries kept in ``cache_file`` for this KB, beyond which the
+        oldest entries are evicted. Defaults to 1000000.
+    use_forward_cache : bool, optional
+        Whether to memoize ``logic_forward`` by the pseudo-labels (and ``x`` via ``x_key_func``
+        if ``logic_forward`` takes it), independently of abl_cache. The memoized results are
+        shared by abduction and evaluation, via ``cached_logic_forward``. This pays off when
+        ``logic_forward`` is expensive and the same pseudo-labels are reasoned repeatedly
+        (e.g. across loops, or by both abduction and evaluation). Defaults to False.
+    forward_cache_size : int, optional
+        The maximum number of memoized results of ``logic_forward``. Defaults to 65536.
+    use_level_cache : bool, optional
+        Whether to also cache the candidates found at each revision level of the exhaustive
+        search (and ``x`` via ``x_key_func`` if ``logic_forward`` takes it), so that a search
+        of the same example with a larger ``max_revision_num`` or ``require_more_revision``
+        only explores the new levels. This only helps when the same example is abduced with
+        different revision settings, as repeated searches are already served by abl_cache.
+        Defaults to False.
+    level_cache_size : int, optional
+        The maximum number of cached revision levels. Defaults to 4096.
+    forward_batch_size : int, optional
+        The maximum number of revisions passed to ``logic_forward_batch`` in each call, which
+        bounds the memory used by ``revise_at_idx``. Defaults to 65536.
 
     Notes
     -----
@@ -54,6 +150,19 @@ class KBBase(ABC):
     ``pseudo_label_list`` and override the ``logic_forward`` function (specifying how to
     perform logical reasoning). After that, other operations (e.g. how to perform abductive
     reasoning) will be automatically set up.
+
+    Optionally, the user-build KB can also provide a ``logic_forward_batch(candidates)``
+    method (or ``logic_forward_batch(candidates, x)`` if ``logic_forward`` takes ``x``),
+    where ``candidates`` is a 2-D ``np.ndarray`` with one candidate per row, and which returns
+    the reasoning results of all rows as a 1-D array. If provided, ``revise_at_idx`` will
+    materialize the revisions in blocks of ``forward_batch_size`` rows, and check the
+    compatibility of each block in a single call.
+
+    The user-build KB can also provide a ``prune_prefix(prefix, y)`` method, which returns
+    True if no pseudo-labels starting with ``prefix`` can have a reasoning result compatible
+    with ``y`` (e.g., in an addition task with non-negative digits, a prefix whose sum already
+    exceeds ``y``). If provided, ``revise_at_idx`` will perform a depth-first branch-and-bound
+    search over the revised positions, and cut every subtree whose determined prefix is pruned.
     """
 
     def __init__(
@@ -62,7 +171,15 @@ class KBBase(ABC):
         max_err: float = 1e-10,
         use_cache: bool = True,
         key_func: Callable = to_hashable,
+        x_key_func: Optional[Callable] = None,
         cache_size: int = 4096,
+        cache_file: Optional[str] = None,
+        cache_file_size: int = 1000000,
+        use_forward_cache: bool = False,
+        forward_cache_size: int = 65536,
+        use_level_cache: bool = False,
+        level_cache_size: int = 4096,
+        forward_batch_size: int = 65536,
     ):
         if not isinstance(pseudo_label_list, list):
             raise TypeError(f"pseudo_label_list should be list, got {type(pseudo_label_list)}")
@@ -71,19 +188,42 @@ class KBBase(ABC):
 
         self.use_cache = use_cache
         self.key_func = key_func
+        self.x_key_func = x_key_func
         self.cache_size = cache_size
+        self.cache_file = cache_file
+        self.cache_file_size = cache_file_size
+        self.use_forward_cache = use_forward_cache
+        self.forward_cache_size = forward_cache_size
+        self.use_level_cache = use_level_cache
+        self.level_cache_size = level_cache_size
+        if not isinstance(forward_batch_size, int) or forward_batch_size <= 0:
+            raise ValueError(
+                f"forward_batch_size should be a positive int, but got {forward_batch_size}"
+            )
+        self.forward_batch_size = forward_batch_size
 
         argspec = inspect.getfullargspec(self.logic_forward)
         self._num_args = len(argspec.args) - 1
         if (
-            self._num_args == 2 and self.use_cache
-        ):  # If the logic_forward function has 2 arguments, then disable cache
+            self._num_args == 2 and self.use_cache and self.x_key_func is None
+        ):  # If the logic_forward function has 2 arguments but x cannot be keyed, disable cache
             self.use_cache = False
             print_log(
-                "The logic_forward function has 2 arguments, so the cache is disabled. ",
+                "The logic_forward function has 2 arguments and x_key_func is not provided, "
+                "so the cache is disabled. ",
                 logger="current",
                 level=logging.WARNING,
             )
+        if self._num_args == 2 and self.x_key_func is None:
+            self.use_forward_cache = False
+            self.use_level_cache = False
+
+        self._use_batch_forward = callable(getattr(self, "logic_forward_batch", None))
+        self._use_prune = callable(getattr(self, "prune_prefix", None))
+        self._label_array = np.array(pseudo_label_list)
+        if self._label_array.ndim != 1 or self._label_array.tolist() != pseudo_label_list:
+            self._label_array = np.empty(len(pseudo_label_list), dtype=object)
+            self._label_array[:] = pseudo_label_list
 
     @abstractmethod
     def logic_forward(self, pseudo_label: List[Any], x: Optional[List[Any]] = None) -> Any:
@@ -106,6 +246,31 @@ class KBBase(ABC):
             The reasoning result.
         """
 
+    @abl_cache(LogicForwardCache)
+    def _logic_forward_memo(self, pseudo_label: List[Any], *x: List[Any]) -> Any:
+        return self.logic_forward(pseudo_label, *x)
+
+    def cached_logic_forward(self, pseudo_label: List[Any], x: Optional[List[Any]] = None) -> Any:
+        """
+        Perform ``logic_forward`` with the results memoized by the pseudo-labels (and ``x`` via
+        ``x_key_func`` if ``logic_forward`` takes it), when ``use_forward_cache`` is True.
+        Call sites evaluating the same pseudo-labels repeatedly (e.g. abduction and evaluation)
+        should use this function instead of ``logic_forward``.
+
+        Parameters
+        ----------
+        pseudo_label : List[Any]
+            Pseudo-labels of an example.
+        x : List[Any], optional
+            The example, which is only passed if ``logic_forward`` takes it.
+
+        Returns
+        -------
+        Any
+            The reasoning result.
+        """
+        return self._logic_forward_memo(pseudo_label, *(x,) if self._num_args == 2 else ())
+
     def abduce_candidates(
         self,
         pseudo_label: List[Any],
@@ -160,6 +325,133 @@ class KBBase(ABC):
         else:
             return reasoning_result == y
 
+    def _check_equal_batch(self, reasoning_results: np.ndarray, y: Any) -> np.ndarray:
+        """
+        Vectorized version of ``_check_equal`` over an array of reasoning results.
+
+        Returns
+        -------
+        np.ndarray
+            A boolean mask of the results that are equal to the ground truth.
+        """
+        if (
+            isinstance(y, (int, float))
+            and not isinstance(y, bool)
+            and np.issubdtype(reasoning_results.dtype, np.number)
+        ):
+            return np.abs(reasoning_results - y) <= self.max_err
+        return np.array([self._check_equal(r, y) for r in reasoning_results], dtype=bool)
+
+    def _revise_at_idx_batch(
+        self,
+        pseudo_label: List[Any],
+        y: Any,
+        x: List[Any],
+        revision_idx: List[int],
+    ) -> List[List[Any]]:
+        """
+        Materialize the revisions at ``revision_idx`` as rows of arrays, in blocks of at most
+        ``forward_batch_size`` rows (consecutive ranges of the revisions numbered in mixed
+        radix), and check the compatibility of each block with one call to
+        ``logic_forward_batch``.
+        """
+        revision_idx = list(revision_idx)
+        revision_num = len(revision_idx)
+        shape = (len(self.pseudo_label_list),) * revision_num
+        total = int(np.prod(shape, dtype=object))
+        new_candidates, new_reasoning_results = [], []
+        for start in range(0, total, self.forward_batch_size):
+            stop = min(start + self.forward_batch_size, total)
+            if revision_num == 0:
+                abduce_c = np.zeros((1, 0), dtype=np.intp)
+            else:
+                abduce_c = np.stack(np.unravel_index(np.arange(start, stop), shape), axis=1)
+            candidates = np.empty((len(abduce_c), len(pseudo_label)), dtype=self._label_array.dtype)
+            candidates[:] = pseudo_label
+            candidates[:, revision_idx] = self._label_array[abduce_c]
+
+            reasoning_results = np.asarray(
+                self.logic_forward_batch(candidates, *(x,) if self._num_args == 2 else ())
+            )
+            mask = self._check_equal_batch(reasoning_results, y)
+            new_candidates.extend(candidates[mask].tolist())
+            new_reasoning_results.extend(reasoning_results[mask].tolist())
+        return new_candidates, new_reasoning_results
+
+    def _search_with_pruning(
+        self,
+        candidate: List[Any],
+        y: Any,
+        x: List[Any],
+        revision_idx: List[int],
+        depth: int,
+        candidates: List[List[Any]],
+        reasoning_results: List[Any],
+        forward: Callable[..., Any],
+    ) -> None:
+        """
+        Depth-first search over the labels of ``revision_idx[depth:]``. After the label at
+        ``revision_idx[depth]`` is set, the prefix up to the next revised position is fully
+        determined, and the subtree is cut if ``prune_prefix`` rejects that prefix. Complete
+        candidates are evaluated by ``forward`` (refer to ``_get_forward``).
+        """
+        if depth == len(revision_idx):
+            reasoning_result = forward(candidate)
+            if self._check_equal(reasoning_result, y):
+                candidates.append(candidate.copy())
+                reasoning_results.append(reasoning_result)
+            return
+
+        idx = revision_idx[depth]
+        end = revision_idx[depth + 1] if depth + 1 < len(revision_idx) else len(candidate)
+        for label in self.pseudo_label_list:
+            candidate[idx] = label
+            if end < len(candidate) and self.prune_prefix(candidate[:end], y):
+                continue
+            self._search_with_pruning(
+                candidate, y, x, revision_idx, depth + 1, candidates, reasoning_results, forward
+            )
+
+    def _get_forward(self, x: List[Any]) -> Callable[[List[Any]], Any]:
+        """
+        Get the function evaluating candidates of the example ``x`` in a search, chosen once
+        per search, so that candidates only go through the memo of ``cached_logic_forward``
+        when ``use_forward_cache`` is True.
+        """
+        if self.use_forward_cache:
+            return lambda candidate: self.cached_logic_forward(candidate, x)
+        if self._num_args == 2:
+            return lambda candidate: self.logic_forward(candidate, x)
+        return self.logic_forward
+
+    def _revise_at_idx_pruned(
+        self,
+        pseudo_label: List[Any],
+        y: Any,
+        x: List[Any],
+        revision_idx: List[int],
+    ) -> List[List[Any]]:
+        """
+        Revise the pseudo-labels at specified index positions by branch-and-bound search,
+        using ``prune_prefix`` to cut subtrees that cannot lead to a compatible candidate.
+        """
+        candidates, reasoning_results = [], []
+        revision_idx = sorted(revision_idx)
+        start = revision_idx[0] if len(revision_idx) > 0 else len(pseudo_label)
+        if 0 < start < len(pseudo_label) and self.prune_prefix(pseudo_label[:start], y):
+            return candidates, reasoning_results
+        self._search_with_pruning(
+            pseudo_label.copy(),
+            y,
+            x,
+            revision_idx,
+            0,
+            candidates,
+            reasoning_results,
+            self._get_forward(x),
+        )
+        return candidates, reasoning_results
+
     def revise_at_idx(
         self,
         pseudo_label: List[Any],
@@ -191,13 +483,19 @@ class KBBase(ABC):
             base. The second element is a list of reasoning results corresponding to each
             candidate, i.e., the outcome of the ``logic_forward`` function.
         """
+        if self._use_prune:
+            return self._revise_at_idx_pruned(pseudo_label, y, x, revision_idx)
+        if self._use_batch_forward:
+            return self._revise_at_idx_batch(pseudo_label, y, x, revision_idx)
+
         candidates, reasoning_results = [], []
+        forward = self._get_forward(x)
         abduce_c = product(self.pseudo_label_list, repeat=len(revision_idx))
         for c in abduce_c:
             candidate = pseudo_label.copy()
             for i, idx in enumerate(revision_idx):
                 candidate[idx] = c[i]
-            reasoning_result = self.logic_forward(candidate, *(x,) if self._num_args == 2 else ())
+            reasoning_result = forward(candidate)
             if self._check_equal(reasoning_result, y):
                 candidates.append(candidate)
                 reasoning_results.append(reasoning_result)
@@ -222,6 +520,22 @@ class KBBase(ABC):
             new_reasoning_results.extend(reasoning_results)
         return new_candidates, new_reasoning_results
 
+    @abl_cache(RevisionLevelCache)
+    def _revision_by_level(
+        self,
+        pseudo_label: List[Any],
+        y: Any,
+        x: List[Any],
+        revision_num: int,
+    ) -> List[List[Any]]:
+        """
+        Same as ``_revision``, but cached by the number of labels to revise, so that the
+        levels explored for an example are reused by later searches, e.g., those with a
+        larger ``max_revision_num`` or ``require_more_revision``, which only extend the
+        frontier of explored levels.
+        """
+        return self._revision(revision_num, pseudo_label, y, x)
+
     @abl_cache()
     def _abduce_by_search(
         self,
@@ -263,7 +577,9 @@ class KBBase(ABC):
         """
         candidates, reasoning_results = [], []
         for revision_num in range(len(pseudo_label) + 1):
-            new_candidates, new_reasoning_results = self._revision(revision_num, pseudo_label, y, x)
+            new_candidates, new_reasoning_results = self._revision_by_level(
+                pseudo_label, y, x, revision_num
+            )
             candidates.extend(new_candidates)
             reasoning_results.extend(new_reasoning_results)
             if len(candidates) > 0:
@@ -277,11 +593,79 @@ class KBBase(ABC):
         ):
             if revision_num > max_revision_num:
                 return candidates, reasoning_results
-            new_candidates, new_reasoning_results = self._revision(revision_num, pseudo_label, y, x)
+            new_candidates, new_reasoning_results = self._revision_by_level(
+                pseudo_label, y, x, revision_num
+            )
             candidates.extend(new_candidates)
             reasoning_results.extend(new_reasoning_results)
         return candidates, reasoning_results
 
+    def _get_fingerprint(self, *extra: Any) -> str:
+        """
+        Get a fingerprint of the knowledge base, i.e., a hash of ``pseudo_label_list``,
+        ``max_err``, ``extra`` and the source of the KB class, which identifies the results
+        persisted on disk. Users can override this function if the reasoning also depends
+        on other states, e.g., an external file.
+        """
+        try:
+            source = inspect.getsource(self.__class__)
+        except (OSError, TypeError):
+            source = self.__class__.__qualname__
+        key = repr((self.pseudo_label_list, self.max_err, *extra, source)).encode("utf-8")
+        return hashlib.sha256(key).hexdigest()[:16]
+
+    def export_cache(self) -> Dict[str, List[Tuple[Any, Any]]]:
+        """
+        Export the entries of the abl_cache owned by this knowledge base. Each knowledge
+        base instance owns its own cache, which is also kept when the instance is pickled
+        (e.g., sent to a worker process).
+
+        Returns
+        -------
+        Dict[str, List[Tuple[Any, Any]]]
+            A mapping from the name of each cached method to its (key, result) pairs.
+        """
+        return export_caches(self)
+
+    def import_cache(self, cache_entries: Dict[str, List[Tuple[Any, Any]]]) -> None:
+        """
+        Import entries exported by ``export_cache`` (e.g., from a copy of this knowledge
+        base in a worker process) into the abl_cache owned by this knowledge base. Entries
+        of disabled caches are skipped.
+
+        Parameters
+        ----------
+        cache_entries : Dict[str, List[Tuple[Any, Any]]]
+            A mapping from the name of each cached method to its (key, result) pairs.
+        """
+        import_caches(self, cache_entries)
+
+    def cache_info(self) -> Dict[str, CacheInfo]:
+        """
+        Report the statistics (hits, misses, evictions, size, estimated bytes and time
+        saved, etc.) of the abl_cache owned by this knowledge base, which can be used to
+        tune ``cache_size``. See ``Cache.cache_info`` for the meaning of each field.
+
+        Returns
+        -------
+        Dict[str, CacheInfo]
+            A mapping from the name of each cached method to the statistics of its cache.
+        """
+        return cache_infos(self)
+
+    def clear_cache(self) -> None:
+        """
+        Invalidate the abl_cache owned by this knowledge base, and reset its statistics.
+        """
+        clear_caches(self)
+
+    def flush_cache(self) -> None:
+        """
+        Block until the entries queued for ``cache_file`` by the abl_cache owned by this
+        knowledge base are written.
+        """
+        flush_caches(self)
+
     def __repr__(self):
         return (
             f"{self.__class__.__name__} is a KB with "
@@ -305,6 +689,24 @@ class GroundKB(KBBase):
         List of possible lengths for pseudo-labels of an example.
     max_err : float, optional
         Refer to class ``KBBase``.
+    GKB_dir : str, optional
+        Directory in which the GKB is persisted. If provided, the GKB of each length is
+        serialized as an array of label indices and an array of reasoning results, in files
+        keyed by the fingerprint of the KB (refer to ``KBBase``) and the length.
+        Later instantiations load these files (memory-mapped when possible) instead of
+        rebuilding the GKB. During construction, intermediate sorted runs are also spilled
+        to this directory, so that the memory used is bounded by ``chunk_size`` rather than
+        by the size of the GKB. If None, the GKB is rebuilt upon every instantiation.
+        Defaults to None.
+    num_workers : int, optional
+        The maximum number of worker processes used to build the GKB, which is also capped
+        by the number of chunks (refer to ``chunk_size``). If None, the number of CPUs is
+        used. If no larger than 1, or if there is only one chunk, the GKB is built in the
+        current process.
+        Defaults to None.
+    chunk_size : int, optional
+        The number of pseudo-label sequences evaluated by ``logic_forward`` in each task
+        when building the GKB. Defaults to 100000.
 
     Notes
     -----
@@ -320,6 +722,9 @@ class GroundKB(KBBase):
         pseudo_label_list: List[Any],
         GKB_len_list: List[int],
         max_err: float = 1e-10,
+        GKB_dir: Optional[str] = None,
+        num_workers: Optional[int] = None,
+        chunk_size: int = 100000,
     ):
         super().__init__(pseudo_label_list, max_err)
         if not isinstance(GKB_len_list, list):
@@ -329,43 +734,278 @@ class GroundKB(KBBase):
                 "GroundKB only supports 1-argument logic_forward, but got "
                 + f"{self._num_args}-argument logic_forward"
             )
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            raise ValueError(f"chunk_size should be a positive int, but got {chunk_size}")
         self.GKB_len_list = GKB_len_list
+        self.GKB_dir = GKB_dir
+        self.num_workers = os.cpu_count() if num_workers is None else num_workers
+        self.chunk_size = chunk_size
+        self._label_to_idx = {label: idx for idx, label in enumerate(self.pseudo_label_list)}
+        self._idx_dtype = np.int16 if len(self.pseudo_label_list) < 2**15 else np.int32
         self.GKB = {}
-        X, Y = self._get_GKB()
-        for x, y in zip(X, Y):
-            self.GKB.setdefault(len(x), defaultdict(list))[y].append(x)
-
-    def _get_XY_list(self, args):
-        pre_x, post_x_it = args[0], args[1]
-        XY_list = []
-        for post_x in post_x_it:
-            x = (pre_x,) + post_x
-            y = self.logic_forward(x)
+        self._GKB_key_slices = {}
+        if self.GKB_dir is None:
+            for length in self.GKB_len_list:
+                self._set_GKB(length, *self._build_GKB(length))
+        else:
+            self._load_GKB()
+
+    def __getstate__(self) -> dict:
+        # A persisted GKB is memory-mapped again from GKB_dir rather than copied, so that
+        # processes share its read-only pages.
+        state = self.__dict__.copy()
+        if self.GKB_dir is not None:
+            state["GKB"], state["_GKB_key_slices"] = {}, {}
+        return state
+
+    def __setstate__(self, state: dict):
+        # Only the lengths already persisted are mapped. Building here would start a pool in
+        # the workers that build the GKB, which receive the KB before any length is written.
+        self.__dict__.update(state)
+        if self.GKB_dir is not None:
+            self._load_GKB(build=False)
+
+    def allowed_labels(self, length: int, idx: int) -> List[Any]:
+        """
+        Get the pseudo-labels allowed at a position of pseudo-label sequences of a given
+        length. Only sequences consisting of allowed pseudo-labels are enumerated when
+        building the GKB. By default, every pseudo-label is allowed at every position.
+        Users can override this function to describe the structure of valid sequences,
+        e.g., digits on even positions and operators on odd positions of a formula,
+        which can shrink the enumeration by orders of magnitude.
+
+        Parameters
+        ----------
+        length : int
+            Length of the pseudo-label sequences.
+        idx : int
+            Position in the pseudo-label sequences.
+
+        Returns
+        -------
+        List[Any]
+            Pseudo-labels (in ``pseudo_label_list``) allowed at this position.
+        """
+        return self.pseudo_label_list
+
+    def _get_XY_chunk(self, args):
+        """
+        Evaluate ``logic_forward`` on the allowed pseudo-label sequences numbered from
+        ``start`` to ``stop`` (in the order of ``product(pseudo_label_list, repeat=length)``),
+        and return the label indices and reasoning results of those whose result is not None.
+        """
+        allowed_idx, start, stop = args
+        digits = np.unravel_index(np.arange(start, stop), [len(a) for a in allowed_idx])
+        X_idx = np.stack([a[d] for a, d in zip(allowed_idx, digits)], axis=1)
+        valid, Y = [], []
+        for row in X_idx.tolist():
+            y = self.logic_forward(tuple(self.pseudo_label_list[idx] for idx in row))
+            valid.append(y is not None)
             if y is not None:
-                XY_list.append((x, y))
-        return XY_list
+                Y.append(y)
+        return X_idx[np.array(valid, dtype=bool)].astype(self._idx_dtype), Y
 
-    def _get_GKB(self):
+    def _get_GKB_runs(self, length: int):
+        """
+        Evaluate all allowed pseudo-label sequences of the given length chunk by chunk, and
+        yield each chunk as a run of label indices and reasoning results. Numerical runs are
+        sorted by reasoning result.
         """
-        Prebuild the GKB according to ``pseudo_label_list`` and ``GKB_len_list``.
+        allowed_idx = [
+            np.array(
+                sorted({self._label_to_idx[label] for label in self.allowed_labels(length, i)}),
+                dtype=np.intp,
+            )
+            for i in range(length)
+        ]
+        total = int(np.prod([len(a) for a in allowed_idx]))
+        arg_list = (
+            (allowed_idx, start, min(start + self.chunk_size, total))
+            for start in range(0, total, self.chunk_size)
+        )
+        # No more workers than chunks are started, and none if there is only one chunk.
+        num_workers = min(self.num_workers, -(-total // self.chunk_size))
+        if num_workers > 1:
+            pool = Pool(processes=num_workers, initializer=_init_GKB_worker, initargs=(self,))
+            ret_it = pool.imap(_get_XY_chunk_in_worker, arg_list)
+        else:
+            pool = None
+            ret_it = map(self._get_XY_chunk, arg_list)
+        try:
+            for X_idx, Y in ret_it:
+                if len(Y) == 0:
+                    continue
+                if all(isinstance(y, (int, float)) and not isinstance(y, bool) for y in Y):
+                    Y_arr = np.array(
+                        Y, dtype=float if any(isinstance(y, float) for y in Y) else int
+                    )
+                    order = np.argsort(Y_arr, kind="stable")
+                    yield X_idx[order], Y_arr[order]
+                else:
+                    Y_arr = np.empty(len(Y), dtype=object)
+                    Y_arr[:] = Y
+                    yield X_idx, Y_arr
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def _merge_numerical_runs(self, runs, X_out: np.ndarray, Y_out: np.ndarray) -> None:
+        """
+        Merge runs sorted by numerical reasoning results into ``X_out`` and ``Y_out`` block
+        by block. In each step, every run contributes its results up to a threshold chosen
+        so that at least one run advances by about ``chunk_size`` rows.
+        """
+        cursors = [0] * len(runs)
+        out = 0
+        while True:
+            active = [i for i, (_, Y) in enumerate(runs) if cursors[i] < len(Y)]
+            if not active:
+                break
+            threshold = min(
+                runs[i][1][min(cursors[i] + self.chunk_size, len(runs[i][1])) - 1] for i in active
+            )
+            part_X, part_Y = [], []
+            for i in active:
+                X, Y = runs[i]
+                end = cursors[i] + np.searchsorted(Y[cursors[i] :], threshold, side="right")
+                part_X.append(X[cursors[i] : end])
+                part_Y.append(Y[cursors[i] : end])
+                cursors[i] = end
+            Y_block = np.concatenate(part_Y)
+            order = np.argsort(Y_block, kind="stable")
+            X_out[out : out + len(order)] = np.concatenate(part_X)[order]
+            Y_out[out : out + len(order)] = Y_block[order]
+            out += len(order)
+
+    def _merge_grouped_runs(self, runs, X_out: np.ndarray, Y_out: np.ndarray) -> None:
         """
-        X, Y = [], []
+        Merge runs of non-numerical reasoning results into ``X_out`` and ``Y_out`` so that
+        equal reasoning results are stored contiguously, in two passes over the runs.
+        """
+        key_to_gid, counts = {}, []
+        for _, Y in runs:
+            for y in Y.tolist():
+                gid = key_to_gid.setdefault(y, len(key_to_gid))
+                if gid == len(counts):
+                    counts.append(0)
+                counts[gid] += 1
+        cursors = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        for X, Y in runs:
+            gids = np.array([key_to_gid[y] for y in Y.tolist()])
+            order = np.argsort(gids, kind="stable")
+            present, starts, sizes = np.unique(gids[order], return_index=True, return_counts=True)
+            for gid, start, size in zip(present, starts, sizes):
+                rows = order[start : start + size]
+                X_out[cursors[gid] : cursors[gid] + size] = X[rows]
+                Y_out[cursors[gid] : cursors[gid] + size] = Y[rows]
+                cursors[gid] += size
+
+    def _build_GKB(self, length: int, path: Optional[str] = None):
+        """
+        Build the GKB of the given length as a matrix of label indices (one candidate per
+        row) and an array of reasoning results. Numerical reasoning results are sorted, and
+        other reasoning results are grouped so that equal ones are stored contiguously.
+        If ``path`` is provided, the intermediate runs are spilled to disk, and the arrays
+        are written to ``path`` instead of being returned.
+        """
+        run_dir = tempfile.mkdtemp(dir=self.GKB_dir) if path is not None else None
+        try:
+            runs = []
+            for i, (X_idx, Y_arr) in enumerate(self._get_GKB_runs(length)):
+                if run_dir is not None:
+                    run_path = os.path.join(run_dir, f"run{i}")
+                    np.save(run_path + "_X.npy", X_idx)
+                    np.save(run_path + "_Y.npy", Y_arr, allow_pickle=Y_arr.dtype == object)
+                    mmap_mode = "r" if Y_arr.dtype != object else None
+                    X_idx = np.load(run_path + "_X.npy", mmap_mode="r")
+                    Y_arr = np.load(run_path + "_Y.npy", mmap_mode=mmap_mode, allow_pickle=True)
+                runs.append((X_idx, Y_arr))
+
+            grouped = any(Y.dtype == object for _, Y in runs)
+            if grouped:
+                runs = [(X, Y.astype(object)) for X, Y in runs]
+                Y_dtype = object
+            else:
+                Y_dtype = np.result_type(*[Y.dtype for _, Y in runs]) if runs else int
+            n = sum(len(Y) for _, Y in runs)
+            # The arrays are written under names unique to this build, so that concurrent
+            # builds of the same GKB do not write to the same files.
+            tmp_path = os.path.join(run_dir, "GKB") if path is not None else None
+            if path is not None:
+                X_out = np.lib.format.open_memmap(
+                    tmp_path + "_X.npy", mode="w+", dtype=self._idx_dtype, shape=(n, length)
+                )
+            else:
+                X_out = np.empty((n, length), dtype=self._idx_dtype)
+            if path is not None and not grouped:
+                Y_out = np.lib.format.open_memmap(
+                    tmp_path + "_Y.npy", mode="w+", dtype=Y_dtype, shape=(n,)
+                )
+            else:
+                Y_out = np.empty(n, dtype=Y_dtype)
+
+            if grouped:
+                self._merge_grouped_runs(runs, X_out, Y_out)
+            else:
+                self._merge_numerical_runs(runs, X_out, Y_out)
+
+            if path is None:
+                return X_out, Y_out
+            X_out.flush()
+            if grouped:
+                with open(tmp_path + "_Y.npy", "wb") as f:
+                    np.save(f, Y_out, allow_pickle=True)
+            else:
+                Y_out.flush()
+            del X_out, Y_out, runs
+            os.replace(tmp_path + "_X.npy", path + "_X.npy")
+            os.replace(tmp_path + "_Y.npy", path + "_Y.npy")
+            return None
+        finally:
+            if run_dir is not None:
+                shutil.rmtree(run_dir, ignore_errors=True)
+
+    def _set_GKB(self, length: int, X_idx: np.ndarray, Y_arr: np.ndarray) -> None:
+        """
+        Store the GKB arrays of the given length. For non-numerical reasoning results, also
+        record the range of rows corresponding to each reasoning result.
+        """
+        self.GKB[length] = (X_idx, Y_arr)
+        if Y_arr.dtype == object:
+            key_slices = {}
+            for i, y in enumerate(Y_arr.tolist()):
+                start, _ = key_slices.get(y, (i, i))
+                key_slices[y] = (start, i + 1)
+            self._GKB_key_slices[length] = key_slices
+
+    def _get_GKB_path(self, length: int) -> str:
+        """
+        Get the path prefix of the persisted GKB of the given length. The file name contains
+        the fingerprint of the KB and the length, so that changing any of them invalidates
+        the persisted GKB.
+        """
+        digest = self._get_fingerprint(length)
+        return os.path.join(self.GKB_dir, f"{self.__class__.__name__}_len{length}_{digest}")
+
+    def _load_GKB(self, build: bool = True) -> None:
+        """
+        Load the GKB from ``GKB_dir``, building and persisting the lengths that have not been
+        persisted yet if ``build`` is True, or else skipping them.
+        """
+        if build:
+            os.makedirs(self.GKB_dir, exist_ok=True)
         for length in self.GKB_len_list:
-            arg_list = []
-            for pre_x in self.pseudo_label_list:
-                post_x_it = product(self.pseudo_label_list, repeat=length - 1)
-                arg_list.append((pre_x, post_x_it))
-            with Pool(processes=len(arg_list)) as pool:
-                ret_list = pool.map(self._get_XY_list, arg_list)
-            for XY_list in ret_list:
-                if len(XY_list) == 0:
+            path = self._get_GKB_path(length)
+            if not os.path.exists(path + "_Y.npy"):
+                if not build:
                     continue
-                part_X, part_Y = zip(*XY_list)
-                X.extend(part_X)
-                Y.extend(part_Y)
-        if Y and isinstance(Y[0], (int, float)):
-            X, Y = zip(*sorted(zip(X, Y), key=lambda pair: pair[1]))
-        return X, Y
+                self._build_GKB(length, path)
+            X_idx = np.load(path + "_X.npy", mmap_mode="r")
+            try:
+                Y_arr = np.load(path + "_Y.npy", mmap_mode="r")
+            except ValueError:  # object arrays cannot be memory-mapped
+                Y_arr = np.load(path + "_Y.npy", allow_pickle=True)
+            self._set_GKB(length, X_idx, Y_arr)
 
     def abduce_candidates(
         self,
@@ -401,48 +1041,44 @@ class GroundKB(KBBase):
             base. The second element is a list of reasoning results corresponding to each
             candidate, i.e., the outcome of the ``logic_forward`` function.
         """
-        if not self.GKB or len(pseudo_label) not in self.GKB_len_list:
+        if len(pseudo_label) not in self.GKB:
             return [], []
 
-        all_candidates, all_reasoning_results = self._find_candidate_GKB(pseudo_label, y)
-        if len(all_candidates) == 0:
+        all_candidates_idx, all_reasoning_results = self._find_candidate_GKB(pseudo_label, y)
+        if len(all_candidates_idx) == 0:
             return [], []
 
-        cost_list = hamming_dist(pseudo_label, all_candidates)
+        pred_idx = np.array([self._label_to_idx.get(label, -1) for label in pseudo_label])
+        cost_list = np.count_nonzero(all_candidates_idx != pred_idx, axis=1)
         min_revision_num = np.min(cost_list)
         revision_num = min(max_revision_num, min_revision_num + require_more_revision)
         idxs = np.where(cost_list <= revision_num)[0]
-        candidates = [all_candidates[idx] for idx in idxs]
-        reasoning_results = [all_reasoning_results[idx] for idx in idxs]
+        candidates = [tuple(c) for c in self._label_array[all_candidates_idx[idxs]].tolist()]
+        reasoning_results = all_reasoning_results[idxs].tolist()
         return candidates, reasoning_results
 
-    def _find_candidate_GKB(self, pseudo_label: List[Any], y: Any) -> List[List[Any]]:
+    def _find_candidate_GKB(self, pseudo_label: List[Any], y: Any) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Retrieve compatible candidates from the prebuilt GKB. For numerical reasoning results,
-        return all candidates and their corresponding reasoning results which fall within the
-        [y - max_err, y + max_err] range.
+        Retrieve compatible candidates from the prebuilt GKB, as a slice of the matrix of
+        label indices and the corresponding slice of reasoning results. For numerical
+        reasoning results, return all candidates and their corresponding reasoning results
+        which fall within the [y - max_err, y + max_err] range.
         """
-        if isinstance(y, (int, float)):
-            potential_candidates = self.GKB[len(pseudo_label)]
-            key_list = list(potential_candidates.keys())
-
-            low_key = bisect.bisect_left(key_list, y - self.max_err)
-            high_key = bisect.bisect_right(key_list, y + self.max_err)
-
-            all_candidates, all_reasoning_results = [], []
-            for key in key_list[low_key:high_key]:
-                for candidate in potential_candidates[key]:
-                    all_candidates.append(candidate)
-                    all_reasoning_results.append(key)
+        X_idx, Y_arr = self.GKB[len(pseudo_label)]
+        if Y_arr.dtype != object:
+            # NumPy scalars (e.g. from Y built with NumPy) are numbers as well.
+            if not isinstance(y, numbers.Real) or isinstance(y, (bool, np.bool_)):
+                return X_idx[:0], Y_arr[:0]
+            low = np.searchsorted(Y_arr, y - self.max_err, side="left")
+            high = np.searchsorted(Y_arr, y + self.max_err, side="right")
         else:
-            all_candidates = self.GKB[len(pseudo_label)][y]
-            all_reasoning_results = [y] * len(all_candidates)
-        return all_candidates, all_reasoning_results
+            low, high = self._GKB_key_slices[len(pseudo_label)].get(y, (0, 0))
+        return X_idx[low:high], Y_arr[low:high]
 
     def __repr__(self):
         GKB_info_parts = []
         for i in self.GKB_len_list:
-            num_candidates = len(self.GKB[i]) if i in self.GKB else 0
+            num_candidates = len(self.GKB[i][1]) if i in self.GKB else 0
             GKB_info_parts.append(f"{num_candidates} candidates of length {i}")
         GKB_info = ", ".join(GKB_info_parts)
 
@@ -469,6 +1105,30 @@ class PrologKB(KBBase):
         Refer to class ``KBBase``.
     pl_file : str
         Prolog file containing the KB.
+    batch_query : bool, optional
+        Whether to revise pseudo-labels in batches, i.e., to collect the revisions of all
+        index subsets of a revision level (or of all given examples in
+        ``batch_revise_at_idx``) in a single ``findall`` goal, instead of querying Prolog once
+        per subset. This requires the queries from ``get_query_string`` to name the revised
+        positions as ``P<idx>``, as the default one does. Defaults to False.
+    num_workers : int, optional
+        The number of worker processes, each hosting its own SWI-Prolog engine consulting
+        ``pl_file``, to which the queries of a revision level (or of ``batch_revise_at_idx``)
+        are distributed. If 0 or 1, all queries run on a single embedded engine. The worker
+        processes are started upon first use, and stopped by ``close``. Within a daemonic
+        process (e.g., a worker of ``Reasoner`` with ``num_workers`` > 1), which cannot have
+        child processes, the embedded engine is used instead. Defaults to 0.
+    term_query : bool, optional
+        Whether ``revise_at_idx`` should build the default query as a Prolog term with
+        pyswip's foreign-term API, with the revised positions as variables, rather than
+        formatting and parsing a query string. The functor is created once and reused across
+        calls. This applies when ``get_query_string`` is not overridden and the pseudo-labels
+        and ``y`` are (nested lists of) integers and atoms, and falls back to the string
+        query otherwise. ``logic_forward`` then also builds its goal as a term. Defaults to
+        False.
+    table_predicates : List[str], optional
+        Predicates (e.g., ``["logic_forward/2"]``) to be tabled after consulting ``pl_file``,
+        so that the answers of frequently hit goals are memoized by Prolog. Defaults to None.
 
     Notes
     -----
@@ -481,11 +1141,27 @@ class PrologKB(KBBase):
     class. Users are also welcome to override related functions for more flexible support.
     """
 
-    def __init__(self, pseudo_label_list: List[Any], pl_file: str):
+    def __init__(
+        self,
+        pseudo_label_list: List[Any],
+        pl_file: str,
+        batch_query: bool = False,
+        num_workers: int = 0,
+        term_query: bool = False,
+        table_predicates: Optional[List[str]] = None,
+    ):
         super().__init__(pseudo_label_list)
+        if not isinstance(num_workers, int):
+            raise TypeError(f"num_workers should be int, but got {type(num_workers)}")
+        self.batch_query = batch_query
+        self.num_workers = num_workers
+        self.term_query = term_query
+        self.table_predicates = table_predicates
+        self._pool = None
+        self._functors = {}
 
         try:
-            import pyswip  # pylint: disable=import-outside-toplevel
+            import pyswip  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
         except (IndexError, ImportError):
             print(
                 "A Prolog-based knowledge base is in use. Please install SWI-Prolog using the"
@@ -494,11 +1170,44 @@ class PrologKB(KBBase):
                 + "for Windows and Mac users."
             )
 
-        self.prolog = pyswip.Prolog()
         self.pl_file = pl_file
         if not os.path.exists(self.pl_file):
             raise FileNotFoundError(f"The Prolog file {self.pl_file} does not exist.")
-        self.prolog.consult(self.pl_file)
+        self.prolog = _consult_prolog(self.pl_file, self.table_predicates)
+
+    def __getstate__(self) -> dict:
+        # The Prolog engine and the worker processes are not transferable.
+        state = self.__dict__.copy()
+        state["prolog"], state["_pool"], state["_functors"] = None, None, {}
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.prolog = _consult_prolog(self.pl_file, self.table_predicates)
+
+    def _query_list(self, query_strings: List[str]) -> List[List[Dict[str, Any]]]:
+        """
+        Run the queries, on the worker processes if ``num_workers`` > 1 (unless in a daemonic
+        process), and return all solutions of each query.
+        """
+        if self.num_workers <= 1 or len(query_strings) <= 1 or current_process().daemon:
+            return [list(self.prolog.query(query_string)) for query_string in query_strings]
+        if self._pool is None:
+            # Spawn rather than fork, so that workers do not inherit the embedded engine.
+            self._pool = get_context("spawn").Pool(
+                self.num_workers,
+                initializer=_init_prolog_worker,
+                initargs=(self.pl_file, self.table_predicates),
+            )
+        return self._pool.map(_query_in_prolog_worker, query_strings)
+
+    def close(self) -> None:
+        """
+        Stop the worker processes, if any. They are restarted upon next use.
+        """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
 
     def logic_forward(self, pseudo_label: List[Any], x: Optional[List[Any]] = None) -> Any:
         """
@@ -516,7 +1225,12 @@ class PrologKB(KBBase):
             is not required in the reasoning process, then this parameter will not have
             any effect.
         """
-        result = list(self.prolog.query(f"logic_forward({pseudo_label}, Res)."))[0]["Res"]
+        # Only the first solution is needed.
+        if self._can_query_terms(pseudo_label):
+            result = self._query_first_term(pseudo_label)
+        else:
+            query_string = f"logic_forward({pseudo_label}, Res)."
+            result = list(self.prolog.query(query_string, maxresult=1))[0]["Res"]
         if result == "true":
             return True
         if result == "false":
@@ -608,20 +1322,241 @@ class PrologKB(KBBase):
             base. The second element is a list of reasoning results corresponding to each
             candidate, i.e., the outcome of the ``logic_forward`` function.
         """
+        if type(self).get_query_string is PrologKB.get_query_string and self._can_query_terms(
+            pseudo_label, y
+        ):
+            abduce_c = self._query_terms(pseudo_label, y, revision_idx)
+        else:
+            query_string = self.get_query_string(pseudo_label, y, x, revision_idx)
+            abduce_c = [list(z.values()) for z in self.prolog.query(query_string)]
+        return self._decode_candidates(pseudo_label, y, revision_idx, abduce_c)
+
+    def _get_functor(self, name: str, arity: int):
+        """
+        Get the functor ``name/arity``, which is created once and reused across queries.
+        """
+        functor = self._functors.get((name, arity))
+        if functor is None:
+            from pyswip import Functor  # pylint: disable=import-outside-toplevel
+
+            functor = self._functors[(name, arity)] = Functor(name, arity)
+        return functor
+
+    def _can_query_terms(self, *values: Any) -> bool:
+        def is_plain(value):
+            if isinstance(value, list):
+                return all(is_plain(item) for item in value)
+            return isinstance(value, str) or (
+                isinstance(value, int) and not isinstance(value, bool)
+            )
+
+        return self.term_query and all(value is None or is_plain(value) for value in values)
+
+    def _solve_term(
+        self,
+        build_args: Callable[[List[Any]], List[Any]],
+        num_variables: int,
+        max_solutions: int = -1,
+    ) -> List[List[Any]]:
+        """
+        Query ``logic_forward`` with the arguments returned by ``build_args`` (given
+        ``num_variables`` new Prolog variables), and return the values of the variables in
+        each of at most ``max_solutions`` (all if negative) solutions. As in pyswip's
+        ``Prolog.query``, the terms are created in a foreign frame which is discarded
+        afterwards, so that they do not pile up on the Prolog stack across queries, and an
+        error raised in Prolog is raised as ``PrologError``.
+        """
+        # pylint: disable=import-outside-toplevel
+        from pyswip import Query, Variable
+        from pyswip.core import PL_discard_foreign_frame, PL_exception, PL_open_foreign_frame
+        from pyswip.easy import getTerm
+        from pyswip.prolog import PrologError
+
+        fid = PL_open_foreign_frame()
+        try:
+            variables = [Variable() for _ in range(num_variables)]
+            args = build_args(variables)
+            query = Query(self._get_functor("logic_forward", len(args))(*args))
+            solutions = []
+            try:
+                while len(solutions) != max_solutions:
+                    if not query.nextSolution():
+                        exception = PL_exception(Query.qid)
+                        if exception:
+                            raise PrologError(
+                                f"Caused by: 'logic_forward{tuple(args)}'. "
+                                f"Returned: '{getTerm(exception)}'."
+                            )
+                        break
+                    solutions.append([self._term_to_python(v.value) for v in variables])
+            finally:
+                query.closeQuery()
+            return solutions
+        finally:
+            PL_discard_foreign_frame(fid)
+
+    def _query_first_term(self, pseudo_label: List[Any]) -> Any:
+        """
+        Query ``logic_forward(pseudo_label, Res)`` as a term, and return ``Res`` of the first
+        solution.
+        """
+        solutions = self._solve_term(lambda variables: [pseudo_label, *variables], 1, 1)
+        if not solutions:
+            raise IndexError(f"logic_forward({pseudo_label}, Res) has no solution.")
+        return solutions[0][0]
+
+    @staticmethod
+    def _term_to_python(value: Any) -> Any:
+        if isinstance(value, list):
+            return [PrologKB._term_to_python(item) for item in value]
+        if hasattr(value, "value") and not isinstance(value, (int, float, str)):
+            return value.value
+        return value
+
+    def _query_terms(
+        self, pseudo_label: List[Any], y: Any, revision_idx: List[int]
+    ) -> List[List[Any]]:
+        """
+        Query ``logic_forward`` (as built by the default ``get_query_string``) with a term
+        whose revised positions are Prolog variables, and return the values of the variables
+        in each solution.
+        """
+
+        def build_args(variables):
+            slots = flatten(pseudo_label)
+            for variable, idx in zip(variables, revision_idx):
+                slots[idx] = variable
+            args = [reform_list(slots, pseudo_label)]
+            if not (y is None or (isinstance(y, list) and y[0] is None)):
+                args.append(y)
+            return args
+
+        return self._solve_term(build_args, len(revision_idx))
+
+    def _decode_candidates(
+        self,
+        pseudo_label: List[Any],
+        y: Any,
+        revision_idx: List[int],
+        abduce_c: List[List[Any]],
+    ) -> Tuple[List[List[Any]], List[Any]]:
+        """
+        Fill the revised labels of each solution into the pseudo-labels.
+        """
         candidates, reasoning_results = [], []
-        query_string = self.get_query_string(pseudo_label, y, x, revision_idx)
-        save_pseudo_label = pseudo_label
-        pseudo_label = flatten(pseudo_label)
-        abduce_c = [list(z.values()) for z in self.prolog.query(query_string)]
+        flat_pseudo_label = flatten(pseudo_label)
         for c in abduce_c:
-            candidate = pseudo_label.copy()
+            candidate = flat_pseudo_label.copy()
             for i, idx in enumerate(revision_idx):
                 candidate[idx] = c[i]
-            candidate = reform_list(candidate, save_pseudo_label)
+            candidate = reform_list(candidate, pseudo_label)
             candidates.append(candidate)
             reasoning_results.append(y)
         return candidates, reasoning_results
 
+    def _get_batch_query_string(
+        self, revision_list: List[Tuple[List[Any], Any, List[Any], List[int]]]
+    ) -> str:
+        """
+        Combine the queries of multiple revisions into a single goal, which finds all
+        solutions of every query as ``[query_no, P<idx>...]``. The revised positions of each
+        query are renamed apart, so that queries do not share variables.
+        """
+        import re  # pylint: disable=import-outside-toplevel
+
+        members = []
+        for i, (pseudo_label, y, x, revision_idx) in enumerate(revision_list):
+            goal = self.get_query_string(pseudo_label, y, x, revision_idx).strip().rstrip(".")
+            goal = re.sub(r"(?<![\w'])P(\d+)\b", rf"P\1_{i}", goal)
+            variables = ",".join(f"P{idx}_{i}" for idx in revision_idx)
+            members.append(f"[{i},[{variables}],({goal})]")
+        return "findall([I|Vs], (member([I,Vs,G], [" + ",".join(members) + "]), call(G)), Res)."
+
+    def batch_revise_at_idx(
+        self, revision_list: List[Tuple[List[Any], Any, List[Any], List[int]]]
+    ) -> List[Tuple[List[List[Any]], List[Any]]]:
+        """
+        Revise pseudo-labels at specified index positions for multiple revisions (e.g., all
+        index subsets of an example, or all examples in a segment) with a single Prolog goal
+        (or one per worker process if ``num_workers`` > 1), so that the cost of a round trip
+        to Prolog is paid once for all of them.
+
+        Parameters
+        ----------
+        revision_list : List[Tuple[List[Any], Any, List[Any], List[int]]]
+            A list of ``(pseudo_label, y, x, revision_idx)``, with the same meanings as the
+            parameters of ``revise_at_idx``.
+
+        Returns
+        -------
+        List[Tuple[List[List[Any]], List[Any]]]
+            The candidates and reasoning results of each revision, as returned by
+            ``revise_at_idx``.
+        """
+        if len(revision_list) == 0:
+            return []
+        num_shards = min(max(self.num_workers, 1), len(revision_list))
+        bounds = np.linspace(0, len(revision_list), num_shards + 1).astype(int)
+        query_strings = [
+            self._get_batch_query_string(revision_list[start:end])
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+        abduce_c_list = [[] for _ in revision_list]
+        for start, solutions in zip(bounds[:-1], self._query_list(query_strings)):
+            for i, *c in solutions[0]["Res"]:
+                # pyswip only converts the top-level bindings, so atoms nested in ``Res``
+                # are converted here.
+                abduce_c_list[start + i].append(self._term_to_python(c))
+        return [
+            self._decode_candidates(pseudo_label, y, revision_idx, abduce_c)
+            for (pseudo_label, y, _, revision_idx), abduce_c in zip(revision_list, abduce_c_list)
+        ]
+
+    def _revision(
+        self,
+        revision_num: int,
+        pseudo_label: List[Any],
+        y: Any,
+        x: List[Any],
+    ) -> List[List[Any]]:
+        """
+        For a specified number of labels to revise, find the candidates compatible with the
+        knowledge base. Unless ``revise_at_idx`` is overridden, all index subsets are revised
+        with a single Prolog goal if ``batch_query`` is True, and the queries are distributed
+        to the worker processes if ``num_workers`` > 1.
+        """
+        if type(self).revise_at_idx is not PrologKB.revise_at_idx or (
+            not self.batch_query and self.num_workers <= 1
+        ):
+            return super()._revision(revision_num, pseudo_label, y, x)
+        revision_list = [
+            (pseudo_label, y, x, list(revision_idx))
+            for revision_idx in combinations(range(len(pseudo_label)), revision_num)
+        ]
+        if self.batch_query:
+            results = self.batch_revise_at_idx(revision_list)
+        else:
+            query_strings = [self.get_query_string(*revision) for revision in revision_list]
+            results = [
+                self._decode_candidates(
+                    pseudo_label, y, revision_idx, [list(z.values()) for z in solutions]
+                )
+                for (_, _, _, revision_idx), solutions in zip(
+                    revision_list, self._query_list(query_strings)
+                )
+            ]
+        new_candidates, new_reasoning_results = [], []
+        for candidates, reasoning_results in results:
+            new_candidates.extend(candidates)
+            new_reasoning_results.extend(reasoning_results)
+        return new_candidates, new_reasoning_results
+
+    def _get_fingerprint(self, *extra: Any) -> str:
+        with open(self.pl_file, "rb") as f:
+            pl_digest = hashlib.sha256(f.read()).hexdigest()
+        return super()._get_fingerprint(pl_digest, *extra)
+
     def __repr__(self):
         return (
             f"{self.__class__.__name__} is a KB with "
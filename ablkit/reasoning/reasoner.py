@@ -5,7 +5,14 @@ between the knowledge base and learning models.
 Copyright (c) 2024 LAMDA.  All rights reserved.
 """
 
+import hashlib
+import heapq
 import inspect
+import pickle
+import weakref
+import zlib
+from collections import ChainMap
+from multiprocessing import Pool, current_process
 from typing import Any, Callable, List, Optional, Union
 
 import numpy as np
@@ -13,7 +20,86 @@ from zoopt import Dimension, Objective, Opt, Parameter, Solution
 
 from ..data.structures import ListData
 from ..reasoning import KBBase
-from ..utils.utils import hamming_dist, confidence_dist, avg_confidence_dist
+from ..utils.cache import record_caches
+from ..utils.utils import (
+    avg_confidence_dist,
+    confidence_dist,
+    hamming_dist,
+    log_confidence_dist,
+)
+
+
+_abduce_worker_reasoner = None
+
+
+def _init_abduce_worker(reasoner):
+    """
+    Initialize a worker process of ``Reasoner.batch_abduce``, so that the reasoner (including
+    its knowledge base) is transferred once per worker rather than once per shard.
+    """
+    global _abduce_worker_reasoner  # pylint: disable=global-statement
+    _abduce_worker_reasoner = reasoner
+    # Only the entries added from now on are sent back.
+    record_caches(reasoner.kb)
+
+
+def _abduce_shard_in_worker(data_examples):
+    return _abduce_worker_reasoner._abduce_shard_in_worker(  # pylint: disable=protected-access
+        data_examples
+    )
+
+
+class _ZOOptStop(Exception):
+    """
+    Raised from the objective of ZOOpt to stop the optimization early.
+    """
+
+
+class _ZOOptBudgetMonitor:
+    """
+    Monitor of the objective evaluations of a ZOOpt optimization, used by the adaptive
+    budget policy of ``Reasoner``. Once a solution better than ``infeasible_value`` (and
+    satisfying the constraint) has been found, the optimization should stop if its score
+    reaches ``lower_bound``, has not improved for ``patience`` evaluations, or if ``budget``
+    evaluations have been used. Otherwise, it goes on until the enlarged budget runs out.
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        patience: Optional[int] = None,
+        lower_bound: Optional[float] = None,
+        infeasible_value: Optional[float] = None,
+    ):
+        self.budget = budget
+        self.patience = patience
+        self.lower_bound = lower_bound
+        self.infeasible_value = infeasible_value
+        self.evaluations = 0
+        self.best_mask, self.best_value = None, float("inf")
+        self.last_improved = 0
+        self.stopped = False
+
+    def update(self, mask: tuple, value: float, feasible: bool) -> bool:
+        """
+        Record an evaluation, and return whether the optimization should stop.
+        """
+        self.evaluations += 1
+        if feasible and value < self.best_value:
+            self.best_mask, self.best_value = mask, value
+            self.last_improved = self.evaluations
+        if self.best_mask is None or (
+            self.infeasible_value is not None and self.best_value >= self.infeasible_value
+        ):
+            return False
+        self.stopped = (
+            (self.lower_bound is not None and self.best_value <= self.lower_bound)
+            or (
+                self.patience is not None and self.evaluations - self.last_improved >= self.patience
+            )
+            or self.evaluations >= self.budget
+        )
+        return self.stopped
 
 
 class Reasoner:
@@ -54,6 +140,51 @@ class Reasoner:
         when performing abductive reasoning. Defaults to 0.
     use_zoopt : bool, optional
         Whether to use ZOOpt library during abductive reasoning. Defaults to False.
+    use_best_first : bool, optional
+        Whether to perform abductive reasoning by best-first search guided by the predicted
+        probabilities. Instead of enumerating all candidates compatible with the knowledge
+        base and then selecting the one with minimum cost, the label substitutions are
+        expanded in increasing order of cost with a priority queue, and the first
+        candidate compatible with the knowledge base (within ``max_revision``) is returned.
+        Only applicable when ``dist_func`` is 'confidence' or 'avg_confidence', and
+        ``require_more_revision`` is ignored in this case. Defaults to False.
+    num_workers : int, optional
+        The number of worker processes used in ``batch_abduce``. If larger than 1, the data
+        examples are split into contiguous shards which are abduced in a process pool, and
+        the results (together with the entries newly cached by the knowledge base in the
+        workers) are gathered back in the original order. In this case, the reasoner
+        (including its knowledge base and ``dist_func``) must be picklable. The pool is
+        started upon first use with a copy of the reasoner, and kept across calls until
+        ``close`` is called, which should also be done after modifying the reasoner or its
+        knowledge base. Otherwise (or in a daemonic process), abduction is performed serially
+        in the current process. With ``use_zoopt``, this runs the ZOOpt optimizations of
+        different data examples concurrently. Defaults to 0.
+    zoopt_seed : int, optional
+        The base seed of ZOOpt. If provided, the optimization of each data example is seeded
+        by a seed derived from ``zoopt_seed`` and the example itself (its pseudo-labels and
+        ``Y``), and the global random state is restored afterwards, so that results are
+        reproducible regardless of the order of examples and of ``num_workers``. Defaults
+        to None.
+    zoopt_warm_start : int, optional
+        The number of best revision masks kept per data example (identified by its ``X`` and
+        ``Y``) after each ZOOpt optimization, which are used as initial samples when the same
+        example is abduced again (e.g., in a later loop). During one optimization, the
+        objective value of each mask is always memoized. Defaults to 0.
+    zoopt_adaptive_budget : bool, optional
+        Whether to adapt the budget of ZOOpt to each data example. If True, the optimization
+        stops as soon as the best possible score is reached (when it can be derived, i.e.,
+        ``zoopt_score`` is not overridden and ``dist_func`` is predefined), or when the
+        score has not improved for ``zoopt_patience`` evaluations. If no revision compatible
+        with the knowledge base has been found within ``zoopt_budget``, the budget is
+        enlarged up to ``zoopt_max_budget_scale`` times. The budget actually used is
+        reported by ``zoopt_budget_info``. Defaults to False.
+    zoopt_patience : int, optional
+        The number of evaluations without improvement after which ZOOpt stops, when
+        ``zoopt_adaptive_budget`` is True. If None, ZOOpt does not stop on plateaus.
+        Defaults to None.
+    zoopt_max_budget_scale : float, optional
+        The maximum factor by which the budget of ZOOpt is enlarged for difficult data
+        examples, when ``zoopt_adaptive_budget`` is True. Defaults to 2.0.
     """
 
     def __init__(
@@ -64,13 +195,40 @@ class Reasoner:
         max_revision: Union[int, float] = -1,
         require_more_revision: int = 0,
         use_zoopt: bool = False,
+        use_best_first: bool = False,
+        num_workers: int = 0,
+        zoopt_seed: Optional[int] = None,
+        zoopt_warm_start: int = 0,
+        zoopt_adaptive_budget: bool = False,
+        zoopt_patience: Optional[int] = None,
+        zoopt_max_budget_scale: float = 2.0,
     ):
         self.kb = kb
         self._check_valid_dist(dist_func)
         self.dist_func = dist_func
         self.use_zoopt = use_zoopt
+        if use_best_first:
+            if use_zoopt:
+                raise ValueError("use_best_first and use_zoopt cannot be both set to True.")
+            if dist_func not in ["confidence", "avg_confidence"]:
+                raise ValueError(
+                    'use_best_first is only applicable when dist_func is "confidence" or '
+                    + f'"avg_confidence", but got {dist_func}.'
+                )
+        self.use_best_first = use_best_first
         self.max_revision = max_revision
         self.require_more_revision = require_more_revision
+        if not isinstance(num_workers, int):
+            raise TypeError(f"num_workers should be int, but got {type(num_workers)}.")
+        self.num_workers = num_workers
+        self._pool, self._pool_finalizer = None, None
+        self.zoopt_seed = zoopt_seed
+        self.zoopt_warm_start = zoopt_warm_start
+        self._zoopt_masks = {}
+        self.zoopt_adaptive_budget = zoopt_adaptive_budget
+        self.zoopt_patience = zoopt_patience
+        self.zoopt_max_budget_scale = zoopt_max_budget_scale
+        self._reset_zoopt_budget_info()
 
         if idx_to_label is None:
             self.idx_to_label = {
@@ -81,6 +239,16 @@ class Reasoner:
             self.idx_to_label = idx_to_label
         self.label_to_idx = dict(zip(self.idx_to_label.values(), self.idx_to_label.keys()))
 
+        # Sorted labels for mapping candidates to indices by binary search, if the labels
+        # form a homogeneous array.
+        labels = list(self.label_to_idx.keys())
+        label_array = np.array(labels)
+        self._sorted_labels, self._sorted_label_idxs = None, None
+        if label_array.ndim == 1 and label_array.dtype != object and label_array.tolist() == labels:
+            order = np.argsort(label_array, kind="stable")
+            self._sorted_labels = label_array[order]
+            self._sorted_label_idxs = np.array([self.label_to_idx[x] for x in labels])[order]
+
     def _check_valid_dist(self, dist_func):
         if isinstance(dist_func, str):
             if dist_func not in ["hamming", "confidence", "avg_confidence"]:
@@ -144,10 +312,43 @@ class Reasoner:
         elif len(candidates) == 1:
             return candidates[0]
         else:
-            cost_array = self._get_cost_list(data_example, candidates, reasoning_results)
+            if (
+                self.dist_func == "confidence"
+                and type(self)._get_cost_list is Reasoner._get_cost_list
+            ):
+                # Rank in log space, so that tiny products of probabilities do not underflow,
+                # unless the costs are customized by a subclass.
+                candidates_idxs = self._get_candidates_idxs(candidates)
+                cost_array = log_confidence_dist(data_example.pred_prob, candidates_idxs)
+            else:
+                cost_array = self._get_cost_list(data_example, candidates, reasoning_results)
             candidate = candidates[np.argmin(cost_array)]
             return candidate
 
+    def _get_candidates_idxs(self, candidates: List[List[Any]]) -> np.ndarray:
+        """
+        Map candidates to a matrix of indices, by binary search over the sorted labels when
+        possible, or else by looking up ``self.label_to_idx``.
+
+        Parameters
+        ----------
+        candidates : List[List[Any]]
+            Multiple possible candidates.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the candidates, one candidate per row.
+        """
+        if self._sorted_labels is not None:
+            candidates_array = np.asarray(candidates)
+            if candidates_array.ndim == 2 and candidates_array.dtype == self._sorted_labels.dtype:
+                pos = np.searchsorted(self._sorted_labels, candidates_array)
+                pos = np.minimum(pos, len(self._sorted_labels) - 1)
+                if np.array_equal(self._sorted_labels[pos], candidates_array):
+                    return self._sorted_label_idxs[pos]
+        return np.array([[self.label_to_idx[x] for x in c] for c in candidates], dtype=np.intp)
+
     def _get_cost_list(
         self,
         data_example: ListData,
@@ -174,10 +375,10 @@ class Reasoner:
         if self.dist_func == "hamming":
             return hamming_dist(data_example.pred_pseudo_label, candidates)
         elif self.dist_func == "confidence":
-            candidates_idxs = [[self.label_to_idx[x] for x in c] for c in candidates]
+            candidates_idxs = self._get_candidates_idxs(candidates)
             return confidence_dist(data_example.pred_prob, candidates_idxs)
         elif self.dist_func == "avg_confidence":
-            candidates_idxs = [[self.label_to_idx[x] for x in c] for c in candidates]
+            candidates_idxs = self._get_candidates_idxs(candidates)
             return avg_confidence_dist(data_example.pred_prob, candidates_idxs)
         else:
             candidate_idxs = [[self.label_to_idx[x] for x in c] for c in candidates]
@@ -214,17 +415,214 @@ class Reasoner:
             The solution for ZOOpt library.
         """
         dimension = Dimension(size=symbol_num, regs=[[0, 1]] * symbol_num, tys=[False] * symbol_num)
+        # The objective value of each revision mask is memoized during the optimization.
+        scores = {}
+        budget = self.zoopt_budget(symbol_num)
+        monitor = self._get_zoopt_budget_monitor(symbol_num, data_example, budget)
+
+        def score(sol):
+            mask = tuple(int(v) for v in sol.get_x())
+            if mask not in scores:
+                scores[mask] = self.zoopt_score(symbol_num, data_example, sol)
+            feasible = sum(mask) <= max_revision_num
+            if monitor.update(mask, scores[mask], feasible) and self.zoopt_adaptive_budget:
+                raise _ZOOptStop
+            return scores[mask]
+
         objective = Objective(
-            lambda sol: self.zoopt_score(symbol_num, data_example, sol),
+            score,
             dim=dimension,
             constraint=lambda sol: self._constrain_revision_num(sol, max_revision_num),
         )
+        example_key = self._get_example_key(data_example) if self.zoopt_warm_start > 0 else None
+        init_samples = [
+            list(mask)
+            for mask in self._zoopt_masks.get(example_key, [])
+            if len(mask) == symbol_num and sum(mask) <= max_revision_num
+        ]
+        seed = self._get_zoopt_seed(data_example)
+        max_budget = budget
+        if self.zoopt_adaptive_budget:
+            # The budget is enlarged for difficult examples, from which the monitor stops early.
+            max_budget = max(budget, int(budget * self.zoopt_max_budget_scale))
         parameter = Parameter(
-            budget=self.zoopt_budget(symbol_num), intermediate_result=False, autoset=True
+            budget=max_budget,
+            intermediate_result=False,
+            autoset=True,
+            seed=seed,
+            init_samples=init_samples or None,
         )
-        solution = Opt.min(objective, parameter)
+        # ZOOpt seeds the global random state, which is restored afterwards.
+        random_state = np.random.get_state() if seed is not None else None
+        try:
+            # ZOOpt ignores the initial samples of its Pareto optimization (used as there is
+            # a constraint), so the kept masks are evaluated first, which may also be good
+            # enough to stop early.
+            for mask in init_samples:
+                score(objective.construct_solution(np.array(mask, dtype=float)))
+            solution = Opt.min(objective, parameter)
+        except _ZOOptStop:
+            solution = None
+        finally:
+            if random_state is not None:
+                np.random.set_state(random_state)
+        # The best mask seen is returned if the optimization is stopped early, or if it is
+        # a kept mask better than the result of ZOOpt.
+        if solution is None or (
+            monitor.best_mask is not None
+            and monitor.best_value < scores.get(tuple(int(v) for v in solution.get_x()), np.inf)
+        ):
+            solution = objective.construct_solution(np.array(monitor.best_mask, dtype=float))
+            solution.set_value(monitor.best_value)
+
+        if example_key is not None:
+            best_masks = sorted(scores, key=scores.get)[: self.zoopt_warm_start]
+            self._zoopt_masks[example_key] = best_masks
+
+        info = self._zoopt_budget_info
+        info["optimizations"] += 1
+        info["budget"] += budget
+        info["evaluations"] += monitor.evaluations
+        if self.zoopt_adaptive_budget:
+            info["early_stops"] += int(monitor.stopped and monitor.evaluations < budget)
         return solution
 
+    def _get_zoopt_budget_monitor(
+        self,
+        symbol_num: int,
+        data_example: ListData,
+        budget: int,
+    ) -> _ZOOptBudgetMonitor:
+        """
+        Get the monitor of ZOOpt evaluations for a data example under the adaptive budget
+        policy. If ``zoopt_score`` is not overridden and ``dist_func`` is predefined, the
+        best possible score is the cost of the most probable label (or of the predicted
+        label for 'hamming') at each position, and the score of a revision without any
+        compatible candidate is ``symbol_num``.
+        """
+        lower_bound, infeasible_value = None, None
+        if type(self).zoopt_score is Reasoner.zoopt_score and isinstance(self.dist_func, str):
+            infeasible_value = symbol_num
+            if self.dist_func == "hamming":
+                lower_bound = 0
+            else:
+                pred_prob = np.asarray(data_example.pred_prob)
+                best_idxs = np.argmax(pred_prob, axis=1)[None, :]
+                if self.dist_func == "confidence":
+                    lower_bound = confidence_dist(pred_prob, best_idxs)[0]
+                else:
+                    lower_bound = avg_confidence_dist(pred_prob, best_idxs)[0]
+                lower_bound += 1e-12
+        return _ZOOptBudgetMonitor(budget, self.zoopt_patience, lower_bound, infeasible_value)
+
+    def _reset_zoopt_budget_info(self) -> None:
+        self._zoopt_budget_info = {
+            "optimizations": 0,
+            "evaluations": 0,
+            "budget": 0,
+            "early_stops": 0,
+        }
+
+    def zoopt_budget_info(self, reset: bool = False) -> dict:
+        """
+        Report how much of the budget of ZOOpt has been used since the last reset.
+
+        Parameters
+        ----------
+        reset : bool, optional
+            Whether to reset the statistics after reporting them. Defaults to False.
+
+        Returns
+        -------
+        dict
+            The number of ZOOpt optimizations (``optimizations``), the total number of
+            objective evaluations actually used (``evaluations``), the total budget given
+            by ``zoopt_budget`` (``budget``), and the number of optimizations stopped before
+            their budget ran out (``early_stops``).
+        """
+        info = dict(self._zoopt_budget_info)
+        if reset:
+            self._reset_zoopt_budget_info()
+        return info
+
+    def _get_example_key(self, data_example: ListData) -> str:
+        """
+        Get a key identifying a data example across loops, i.e., a digest of its ``X``
+        and ``Y``.
+        """
+        return hashlib.sha1(pickle.dumps((data_example.X, data_example.Y))).hexdigest()
+
+    def _get_zoopt_seed(self, data_example: ListData) -> Optional[int]:
+        """
+        Derive the seed of ZOOpt for a data example from ``zoopt_seed`` and the example
+        itself, or return None if ``zoopt_seed`` is not provided.
+        """
+        if self.zoopt_seed is None:
+            return None
+        key = repr((self.zoopt_seed, data_example.pred_pseudo_label, data_example.Y))
+        # ZOOpt ignores a seed of 0.
+        return zlib.crc32(key.encode("utf-8")) % (2**31 - 1) + 1
+
+    def _best_first_get_candidate(
+        self,
+        data_example: ListData,
+        max_revision_num: int,
+    ) -> List[Any]:
+        """
+        Get the candidate with minimum cost that is compatible with the knowledge base by
+        best-first search. For each symbol, labels are ranked by their predicted
+        probabilities, and a priority queue of rank assignments is expanded in increasing
+        order of cost. Each assignment is reached through a unique path (increasing ranks
+        at non-decreasing positions), so no assignment is visited twice.
+
+        Parameters
+        ----------
+        data_example : ListData
+            Data example.
+        max_revision_num : int
+            Specifies the maximum number of revisions allowed.
+
+        Returns
+        -------
+        List[Any]
+            The selected candidate, or an empty list if no candidate is found.
+        """
+        pred_prob = np.asarray(data_example.pred_prob)
+        if self.dist_func == "confidence":
+            score = np.log(np.clip(pred_prob, 1e-9, 1))
+        else:
+            score = pred_prob
+        order = np.argsort(-score, axis=1, kind="stable")
+        sorted_score = np.take_along_axis(score, order, axis=1)
+        delta = sorted_score[:, :1] - sorted_score
+        symbol_num, label_num = order.shape
+        pred_idx = [self.label_to_idx[label] for label in data_example.pred_pseudo_label]
+        pred_rank = np.argmax(order == np.array(pred_idx)[:, None], axis=1)
+        x_args = (data_example.X,) if self.kb._num_args == 2 else ()  # pylint: disable=W0212
+
+        heap = [(0.0, (0,) * symbol_num, 0)]
+        while heap:
+            cost, ranks, last = heapq.heappop(heap)
+            revised = [r != pred_rank[i] for i, r in enumerate(ranks)]
+            if sum(revised) <= max_revision_num:
+                candidate = [self.idx_to_label[order[i, r]] for i, r in enumerate(ranks)]
+                reasoning_result = self.kb.logic_forward(candidate, *x_args)
+                if self.kb._check_equal(reasoning_result, data_example.Y):  # pylint: disable=W0212
+                    return candidate
+            # Positions before ``last`` are fixed in all successors, and a position whose rank
+            # is already beyond the predicted label can never be unrevised again.
+            min_revision_num = sum(revised[:last]) + sum(
+                ranks[j] > pred_rank[j] for j in range(last, symbol_num)
+            )
+            if min_revision_num > max_revision_num:
+                continue
+            for j in range(last, symbol_num):
+                if ranks[j] + 1 < label_num:
+                    new_cost = cost + delta[j, ranks[j] + 1] - delta[j, ranks[j]]
+                    new_ranks = ranks[:j] + (ranks[j] + 1,) + ranks[j + 1 :]
+                    heapq.heappush(heap, (new_cost, new_ranks, j))
+        return []
+
     def zoopt_score(
         self,
         symbol_num: int,
@@ -324,6 +722,9 @@ class Reasoner:
         symbol_num = data_example.elements_num("pred_pseudo_label")
         max_revision_num = self._get_max_revision_num(self.max_revision, symbol_num)
 
+        if self.use_best_first:
+            return self._best_first_get_candidate(data_example, max_revision_num)
+
         if self.use_zoopt:
             solution = self._zoopt_get_solution(symbol_num, data_example, max_revision_num)
             revision_idx = np.where(solution.get_x() != 0)[0]
@@ -345,14 +746,170 @@ class Reasoner:
         candidate = self._get_one_candidate(data_example, candidates, reasoning_results)
         return candidate
 
+    def _use_segment_cost(self) -> bool:
+        """
+        Whether the candidates of a whole shard can be selected at once by
+        ``_segment_get_candidates``, i.e., exhaustive search with a predefined ``dist_func``
+        and none of the related methods overridden.
+        """
+        cls = type(self)
+        return (
+            isinstance(self.dist_func, str)
+            and not self.use_zoopt
+            and not self.use_best_first
+            and cls.abduce is Reasoner.abduce
+            and cls._get_one_candidate is Reasoner._get_one_candidate
+            and cls._get_cost_list is Reasoner._get_cost_list
+        )
+
+    def _segment_get_candidates(
+        self,
+        data_examples: ListData,
+        candidates_list: List[List[List[Any]]],
+    ) -> List[List[Any]]:
+        """
+        Select the candidate with the minimum cost for each of the data examples, with the
+        costs of all candidates of the same length computed together. The candidates are
+        concatenated into one index matrix along with the example each row belongs to, and
+        the minimum is taken per example by a segmented reduction.
+
+        Parameters
+        ----------
+        data_examples : ListData
+            Data examples.
+        candidates_list : List[List[List[Any]]]
+            Candidates of each data example.
+
+        Returns
+        -------
+        List[List[Any]]
+            A selected candidate for each data example, as by ``_get_one_candidate``.
+        """
+        selected = [candidates[0] if len(candidates) > 0 else [] for candidates in candidates_list]
+        groups = {}
+        for i, candidates in enumerate(candidates_list):
+            if len(candidates) > 1:
+                groups.setdefault(len(candidates[0]), []).append(i)
+
+        for example_ids in groups.values():
+            candidates_idxs = np.concatenate(
+                [self._get_candidates_idxs(candidates_list[i]) for i in example_ids]
+            )
+            counts = [len(candidates_list[i]) for i in example_ids]
+            segment_ids = np.repeat(np.arange(len(example_ids)), counts)
+
+            if self.dist_func == "hamming":
+                pred_idxs = self._get_candidates_idxs(
+                    [data_examples.pred_pseudo_label[i] for i in example_ids]
+                )
+                costs = np.sum(candidates_idxs != pred_idxs[segment_ids], axis=1)
+            else:
+                pred_prob = np.stack(
+                    [np.asarray(data_examples.pred_prob[i], dtype=float) for i in example_ids]
+                )
+                if self.dist_func == "confidence":
+                    costs = log_confidence_dist(pred_prob, candidates_idxs, segment_ids)
+                else:
+                    costs = avg_confidence_dist(pred_prob, candidates_idxs, segment_ids)
+
+            # Sort by (segment, cost) stably, and take the first row of each segment.
+            order = np.lexsort((costs, segment_ids))
+            firsts = order[np.searchsorted(segment_ids[order], np.arange(len(example_ids)))]
+            offsets = np.cumsum([0] + counts[:-1])
+            for j, i in enumerate(example_ids):
+                selected[i] = candidates_list[i][firsts[j] - offsets[j]]
+        return selected
+
+    def _abduce_shard(self, data_examples: ListData) -> List[List[Any]]:
+        """
+        Serially perform abductive reasoning on a shard of data examples. When possible
+        (refer to ``_use_segment_cost``), the candidates of all data examples are abduced
+        first and then selected at once by ``_segment_get_candidates``.
+        """
+        if not self._use_segment_cost():
+            return [self.abduce(data_example) for data_example in data_examples]
+        candidates_list = []
+        for data_example in data_examples:
+            symbol_num = data_example.elements_num("pred_pseudo_label")
+            candidates, _ = self.kb.abduce_candidates(
+                pseudo_label=data_example.pred_pseudo_label,
+                y=data_example.Y,
+                x=data_example.X,
+                max_revision_num=self._get_max_revision_num(self.max_revision, symbol_num),
+                require_more_revision=self.require_more_revision,
+            )
+            candidates_list.append(candidates)
+        return self._segment_get_candidates(data_examples, candidates_list)
+
+    def _abduce_shard_in_worker(self, data_examples: ListData):
+        """
+        Abduce a shard of data examples in a worker process, and also return the entries
+        added to the knowledge base's cache, the masks kept for warm-starting ZOOpt and the
+        usage of the ZOOpt budget during the shard, so that they can be merged back into the
+        main process. The writes to ``cache_file`` are committed before returning, as the
+        pool may be terminated right after.
+        """
+        self._reset_zoopt_budget_info()
+        known_masks = self._zoopt_masks
+        self._zoopt_masks = ChainMap({}, known_masks)
+        try:
+            ret = self._abduce_shard(data_examples)
+            new_masks = self._zoopt_masks.maps[0]
+        finally:
+            known_masks.update(self._zoopt_masks.maps[0])
+            self._zoopt_masks = known_masks
+        self.kb.flush_cache()
+        return ret, (record_caches(self.kb), new_masks, self._zoopt_budget_info)
+
+    def _parallel_abduce(self, data_examples: ListData) -> List[List[Any]]:
+        """
+        Split the data examples into at most ``num_workers`` contiguous shards, abduce them
+        in the process pool, and concatenate the results in the original order.
+        """
+        if self._pool is None:
+            self._pool = Pool(
+                processes=self.num_workers, initializer=_init_abduce_worker, initargs=(self,)
+            )
+            # The workers are stopped when the reasoner is collected or at exit.
+            self._pool_finalizer = weakref.finalize(self, self._pool.terminate)
+        num_shards = min(self.num_workers, len(data_examples))
+        bounds = np.linspace(0, len(data_examples), num_shards + 1).astype(int)
+        shards = [data_examples[bounds[i] : bounds[i + 1]] for i in range(num_shards)]
+        ret_list = self._pool.map(_abduce_shard_in_worker, shards, chunksize=1)
+        for _, (cache_entries, zoopt_masks, zoopt_budget_info) in ret_list:
+            self.kb.import_cache(cache_entries)
+            self._zoopt_masks.update(zoopt_masks)
+            for key, value in zoopt_budget_info.items():
+                self._zoopt_budget_info[key] += value
+        return [candidate for ret, _ in ret_list for candidate in ret]
+
     def batch_abduce(self, data_examples: ListData) -> List[List[Any]]:
         """
         Perform abductive reasoning on the given prediction data examples.
-        For detailed information, refer to ``abduce``.
+        For detailed information, refer to ``abduce``. If ``num_workers`` is larger than 1,
+        the data examples are abduced in a process pool.
         """
-        abduced_pseudo_label = [self.abduce(data_example) for data_example in data_examples]
+        if self.num_workers > 1 and len(data_examples) > 1 and not current_process().daemon:
+            abduced_pseudo_label = self._parallel_abduce(data_examples)
+        else:
+            abduced_pseudo_label = self._abduce_shard(data_examples)
         data_examples.abduced_pseudo_label = abduced_pseudo_label
         return abduced_pseudo_label
 
+    def close(self) -> None:
+        """
+        Stop the worker processes of ``batch_abduce``, if any. They are restarted upon next
+        use, with a copy of the reasoner at that time.
+        """
+        if self._pool is not None:
+            self._pool_finalizer()
+            self._pool = None
+
+    def __getstate__(self) -> dict:
+        # The worker processes are not transferable.
+        state = self.__dict__.copy()
+        state["_pool"] = state["_pool_finalizer"] = None
+        return state
+
     def __call__(self, data_examples: ListData) -> List[List[Any]]:
         return self.batch_abduce(data_examples)
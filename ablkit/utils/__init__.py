@@ -1,8 +1,23 @@
-from .cache import Cache, abl_cache
+from .cache import (
+    Cache,
+    CacheInfo,
+    DiskCache,
+    LogicForwardCache,
+    RevisionLevelCache,
+    abl_cache,
+    cache_infos,
+    clear_caches,
+    export_caches,
+    flush_caches,
+    get_cache,
+    import_caches,
+    record_caches,
+)
 from .logger import ABLLogger, print_log
 from .utils import (
     confidence_dist,
     avg_confidence_dist,
+    log_confidence_dist,
     flatten,
     hamming_dist,
     reform_list,
@@ -12,14 +27,26 @@ from .utils import (
 
 __all__ = [
     "Cache",
+    "CacheInfo",
+    "DiskCache",
+    "LogicForwardCache",
+    "RevisionLevelCache",
     "ABLLogger",
     "print_log",
     "confidence_dist",
     "avg_confidence_dist",
+    "log_confidence_dist",
     "flatten",
     "hamming_dist",
     "reform_list",
     "to_hashable",
     "abl_cache",
+    "get_cache",
+    "export_caches",
+    "flush_caches",
+    "import_caches",
+    "record_caches",
+    "cache_infos",
+    "clear_caches",
     "tab_data_to_tuple",
 ]
@@ -11,12 +11,230 @@ Modified from
 https://github.com/python/cpython/blob/3.12/Lib/functools.py
 """
 
-from typing import Callable, Generic, TypeVar
+import logging
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+import weakref
+from collections import namedtuple
+from functools import wraps
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+from .logger import print_log
 
 K = TypeVar("K")
 T = TypeVar("T")
 PREV, NEXT, KEY, RESULT = 0, 1, 2, 3  # names for the link fields
 
+_cache_init_lock = threading.Lock()
+
+CacheInfo = namedtuple(
+    "CacheInfo",
+    ["hits", "misses", "disk_hits", "evictions", "max_size", "size", "bytes", "time_saved"],
+)
+
+
+def _connect_disk_cache(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+    # Switching a new file to WAL does not wait for the other processes opening it at the
+    # same time (e.g., workers of a pool), so it is retried.
+    for delay in (0.01, 0.05, 0.1, 0.5, 1.0, None):
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            break
+        except sqlite3.OperationalError:
+            if delay is None:
+                raise
+            time.sleep(delay)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS abl_cache "
+        "(namespace TEXT, key BLOB, result BLOB, PRIMARY KEY (namespace, key))"
+    )
+    conn.commit()
+    return conn
+
+
+def _disk_cache_write_loop(path: str, namespace: str, max_size: int, write_queue: queue.Queue):
+    """
+    Commit the entries queued for a ``DiskCache`` in batches, until ``None`` is queued.
+    Errors of a batch are logged and the batch is dropped, so that the queue is always
+    consumed and ``DiskCache.flush`` never blocks forever.
+    """
+    conn, size, failed = None, 0, False
+    while True:
+        batch = [write_queue.get()]
+        while batch[-1] is not None:
+            try:
+                batch.append(write_queue.get_nowait())
+            except queue.Empty:
+                break
+        stop = batch[-1] is None
+        entries = [entry for entry in batch if entry is not None]
+        try:
+            if entries:
+                if conn is None:
+                    conn = _connect_disk_cache(path)
+                    (size,) = conn.execute(
+                        "SELECT COUNT(*) FROM abl_cache WHERE namespace = ?", (namespace,)
+                    ).fetchone()
+                # Results of a key never change, so existing entries are kept as they are,
+                # and the number of entries is tracked without counting the table.
+                size += conn.executemany(
+                    "INSERT OR IGNORE INTO abl_cache VALUES (?, ?, ?)",
+                    [(namespace, key, result) for key, result in entries],
+                ).rowcount
+                if size > max_size:
+                    # Other processes may write to the namespace as well, so the number of
+                    # entries is recounted before evicting, down to a low-water mark.
+                    (size,) = conn.execute(
+                        "SELECT COUNT(*) FROM abl_cache WHERE namespace = ?", (namespace,)
+                    ).fetchone()
+                    if size > max_size:
+                        num_evicted = size - (max_size - max_size // 10)
+                        conn.execute(
+                            "DELETE FROM abl_cache WHERE rowid IN (SELECT rowid FROM abl_cache "
+                            "WHERE namespace = ? ORDER BY rowid LIMIT ?)",
+                            (namespace, num_evicted),
+                        )
+                        size -= num_evicted
+                conn.commit()
+        except Exception as e:  # pylint: disable=broad-except
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+                conn, size = None, 0
+            if not failed:
+                print_log(
+                    f"Failed to write the cache file {path}, so the entries are dropped "
+                    f"(further failures are not reported): {e!r}",
+                    logger="current",
+                    level=logging.WARNING,
+                )
+                failed = True
+        finally:
+            for _ in batch:
+                write_queue.task_done()
+        if stop:
+            break
+    if conn is not None:
+        conn.close()
+
+
+def _close_disk_cache(
+    pid: int, conn: sqlite3.Connection, write_queue: queue.Queue, writer: threading.Thread
+):
+    # The finalizer is inherited by forked processes, where the writer thread does not exist.
+    if os.getpid() != pid:
+        return
+    write_queue.put(None)
+    writer.join()
+    conn.close()
+
+
+class DiskCache:
+    """
+    A persistent cache tier backed by an SQLite file, used under the in-memory ``Cache``
+    so that cached results survive across runs.
+
+    Entries are stored under a namespace (e.g., identifying the knowledge base and the
+    cached method), with pickled keys and results. Reads are synchronous, while writes
+    are queued and committed in batches by a background thread. Once the namespace holds
+    more than ``max_size`` entries, the oldest written ones are evicted. Errors when
+    writing are logged, and the failed entries are dropped. The thread and connections
+    are released by ``close``, when the cache is garbage collected, or at exit (after
+    committing the queued writes).
+
+    Parameters
+    ----------
+    path : str
+        Path of the SQLite file.
+    namespace : str
+        Namespace of the entries.
+    max_size : int
+        The maximum number of entries kept in the namespace.
+    """
+
+    def __init__(self, path: str, namespace: str, max_size: int):
+        self.path = path
+        self.namespace = namespace
+        self.max_size = max_size
+        self._pid = None
+        self._finalizer = None
+
+    def __getstate__(self) -> dict:
+        self.flush()
+        return {"path": self.path, "namespace": self.namespace, "max_size": self.max_size}
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._pid = None
+        self._finalizer = None
+
+    def _ensure_open(self):
+        # Connections and the writer thread are not inherited across processes.
+        if self._pid == os.getpid() and self._finalizer.alive:
+            return
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._conn = _connect_disk_cache(self.path)
+        self._queue = queue.Queue()
+        # The thread does not refer to the cache, so that the cache can be collected.
+        writer = threading.Thread(
+            target=_disk_cache_write_loop,
+            args=(self.path, self.namespace, self.max_size, self._queue),
+            daemon=True,
+        )
+        writer.start()
+        self._finalizer = weakref.finalize(
+            self, _close_disk_cache, self._pid, self._conn, self._queue, writer
+        )
+
+    def get(self, cache_key: Any) -> Tuple[bool, Any]:
+        """
+        Read the result of ``cache_key``.
+
+        Returns
+        -------
+        Tuple[bool, Any]
+            Whether the key is found, and the result if found.
+        """
+        self._ensure_open()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM abl_cache WHERE namespace = ? AND key = ?",
+                (self.namespace, pickle.dumps(cache_key)),
+            ).fetchone()
+        if row is None:
+            return False, None
+        return True, pickle.loads(row[0])
+
+    def put(self, cache_key: Any, result: Any):
+        """
+        Queue the result of ``cache_key`` to be written.
+        """
+        self._ensure_open()
+        self._queue.put((pickle.dumps(cache_key), pickle.dumps(result)))
+
+    def flush(self):
+        """
+        Block until all queued writes are committed (or dropped due to errors).
+        """
+        if self._pid == os.getpid() and self._finalizer.alive:
+            self._queue.join()
+
+    def close(self):
+        """
+        Commit the queued writes, then stop the writer thread and close the connections.
+        The cache is reopened if it is used again.
+        """
+        if self._pid == os.getpid() and self._finalizer.alive:
+            self._finalizer()
+
 
 class Cache(Generic[K, T]):
     """
@@ -25,7 +243,9 @@ class Cache(Generic[K, T]):
 
     This class implements a dictionary-based cache with a circular doubly linked
     list to manage the cache entries efficiently. It is designed to be generic,
-    allowing for caching of any callable function.
+    allowing for caching of any callable function. Updates of the cache are guarded
+    by a lock, so that a cache can be shared by multiple threads. A cache can also be
+    pickled (the cached function excluded), in which case its entries are kept.
 
     Parameters
     ----------
@@ -34,16 +254,32 @@ class Cache(Generic[K, T]):
         returns a value of type T.
     """
 
+    # Attributes of the owning object that enable the cache and bound its size
+    enable_attr = "use_cache"
+    size_attr = "cache_size"
+
     def __init__(self, func: Callable[[K], T]):
         self.func = func
         self.has_init = False
 
         self.cache = False
-        self.cache_dict = {}
         self.key_func = None
+        self.x_key_func = None
         self.max_size = 0
 
-        self.hits, self.misses = 0, 0
+        self._reset_stats()
+        self.disk_cache: Optional[DiskCache] = None
+        # Entries put by lookups since recording started (refer to ``record_caches``), if any
+        self.recorded: Optional[List[Tuple[Any, T]]] = None
+        self.lock = threading.RLock()
+        self._reset_links()
+
+    def _reset_stats(self):
+        self.hits, self.misses, self.disk_hits, self.evictions = 0, 0, 0, 0
+        self.num_computed, self.compute_time = 0, 0.0
+
+    def _reset_links(self):
+        self.cache_dict = {}
         self.full = False
         self.root = []  # root of the circular doubly linked list
         self.root[:] = [self.root, self.root, None, None]
@@ -51,11 +287,62 @@ class Cache(Generic[K, T]):
     def __getitem__(self, obj, *args) -> T:
         return self.get_from_dict(obj, *args)
 
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        for name in ("func", "lock", "cache_dict", "full", "root"):
+            del state[name]
+        state["entries"] = self.export_cache()
+        state["recorded"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        entries = state.pop("entries")
+        self.__dict__.update(state)
+        self.func = None
+        self.lock = threading.RLock()
+        self._reset_links()
+        self.import_cache(entries)
+
     def clear_cache(self):
         """
-        Invalidate the entire cache.
+        Invalidate the entire cache, and reset its statistics.
+        """
+        with self.lock:
+            self._reset_links()
+            self._reset_stats()
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Report the statistics of the cache.
+
+        Returns
+        -------
+        CacheInfo
+            A named tuple with the following fields:
+
+            - ``hits``, ``misses``: Number of lookups found and not found in memory.
+            - ``disk_hits``: Number of misses served by the persistent tier, if any.
+            - ``evictions``: Number of entries evicted from memory as the cache is full.
+            - ``max_size``, ``size``: Maximum and current number of entries in memory.
+            - ``bytes``: Estimated memory footprint of the entries, measured by their
+              pickled sizes.
+            - ``time_saved``: Estimated seconds saved by hits, i.e., the number of hits
+              times the average time of computing a result.
         """
-        self.cache_dict.clear()
+        entries = self.export_cache()
+        with self.lock:
+            num_bytes = sum(len(pickle.dumps(entry)) for entry in entries)
+            avg_time = self.compute_time / self.num_computed if self.num_computed else 0.0
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.disk_hits,
+                self.evictions,
+                self.max_size,
+                len(entries),
+                num_bytes,
+                (self.hits + self.disk_hits) * avg_time,
+            )
 
     def init_cache(self, obj):
         """
@@ -69,54 +356,68 @@ class Cache(Generic[K, T]):
         if self.has_init:
             return
 
-        self.cache = True
-        self.cache_dict = {}
-        self.key_func = obj.key_func
-        self.max_size = obj.cache_size
+        with self.lock:
+            self.cache = True
+            self.key_func = obj.key_func
+            self.x_key_func = getattr(obj, "x_key_func", None)
+            self.max_size = getattr(obj, self.size_attr)
+            if self.enable_attr == "use_cache" and getattr(obj, "cache_file", None) is not None:
+                fingerprint = obj._get_fingerprint()  # pylint: disable=protected-access
+                namespace = f"{type(obj).__name__}_{fingerprint}.{self.func.__name__}"
+                self.disk_cache = DiskCache(obj.cache_file, namespace, obj.cache_file_size)
 
-        self.hits, self.misses = 0, 0
-        self.full = False
-        self.root = []  # root of the circular doubly linked list
-        self.root[:] = [self.root, self.root, None, None]
+            self._reset_stats()
+            self._reset_links()
 
-        self.has_init = True
+            self.has_init = True
 
-    def get_from_dict(self, obj, *args) -> T:
+    def export_cache(self) -> List[Tuple[Any, T]]:
         """
-        Retrieve a value from the cache or compute it using ``self.func``.
-
-        Parameters
-        ----------
-        obj : Any
-            The object to which the cached method/function belongs.
-        *args : Any
-            Arguments used in key generation for cache retrieval or function computation.
+        Export the entries of the cache.
 
         Returns
         -------
-        T
-            The value from the cache or computed by the function.
+        List[Tuple[Any, T]]
+            The (key, result) pairs in the cache, from the least to the most recently used.
         """
-        # x is not used in cache key
-        pred_pseudo_label, y, _x, *res_args = args
-        cache_key = (self.key_func(pred_pseudo_label), self.key_func(y), *res_args)
-        link = self.cache_dict.get(cache_key)
-        if link is not None:
-            # Move the link to the front of the circular queue
-            link_prev, link_next, _key, result = link
-            link_prev[NEXT] = link_next
-            link_next[PREV] = link_prev
-            last = self.root[PREV]
-            last[NEXT] = self.root[PREV] = link
-            link[PREV] = last
-            link[NEXT] = self.root
-            self.hits += 1
-            return result
-        self.misses += 1
+        with self.lock:
+            entries = []
+            link = self.root[NEXT]
+            while link is not self.root:
+                entries.append((link[KEY], link[RESULT]))
+                link = link[NEXT]
+            return entries
+
+    def import_cache(self, entries: List[Tuple[Any, T]]):
+        """
+        Import entries into the cache, e.g. those exported from a cache in another process.
+        Imported entries become the most recently used ones, and the least recently used
+        entries are evicted if the cache is full.
+
+        Parameters
+        ----------
+        entries : List[Tuple[Any, T]]
+            The (key, result) pairs to import, from the least to the most recently used.
+        """
+        with self.lock:
+            for cache_key, result in entries:
+                self._put(cache_key, result)
 
-        result = self.func(obj, *args)
+    def _move_to_front(self, link):
+        link_prev, link_next, _key, _result = link
+        link_prev[NEXT] = link_next
+        link_next[PREV] = link_prev
+        last = self.root[PREV]
+        last[NEXT] = self.root[PREV] = link
+        link[PREV] = last
+        link[NEXT] = self.root
 
-        if self.full:
+    def _put(self, cache_key, result):
+        link = self.cache_dict.get(cache_key)
+        if link is not None:
+            link[RESULT] = result
+            self._move_to_front(link)
+        elif self.full:
             # Use the old root to store the new key and result.
             oldroot = self.root
             oldroot[KEY] = cache_key
@@ -128,6 +429,7 @@ class Cache(Generic[K, T]):
             # Now update the cache dictionary.
             del self.cache_dict[oldkey]
             self.cache_dict[cache_key] = oldroot
+            self.evictions += 1
         else:
             # Put result in a new link at the front of the queue.
             last = self.root[PREV]
@@ -135,12 +437,263 @@ class Cache(Generic[K, T]):
             last[NEXT] = self.root[PREV] = self.cache_dict[cache_key] = link
             if isinstance(self.max_size, int):
                 self.full = len(self.cache_dict) >= self.max_size
+
+    def _make_key(self, args: tuple) -> Any:
+        # x is used in cache key only if x_key_func is provided
+        pred_pseudo_label, y, x, *res_args = args
+        cache_key = (self.key_func(pred_pseudo_label), self.key_func(y), *res_args)
+        if self.x_key_func is not None:
+            cache_key += (self.x_key_func(x),)
+        return cache_key
+
+    def get_from_dict(self, obj, *args) -> T:
+        """
+        Retrieve a value from the cache or compute it using ``self.func``.
+
+        Parameters
+        ----------
+        obj : Any
+            The object to which the cached method/function belongs.
+        *args : Any
+            Arguments used in key generation for cache retrieval or function computation.
+
+        Returns
+        -------
+        T
+            The value from the cache or computed by the function.
+        """
+        cache_key = self._make_key(args)
+        with self.lock:
+            link = self.cache_dict.get(cache_key)
+            if link is not None:
+                # Move the link to the front of the circular queue
+                self._move_to_front(link)
+                self.hits += 1
+                return link[RESULT]
+            self.misses += 1
+
+        # The lock is released while computing, so that other threads are not blocked.
+        found = False
+        if self.disk_cache is not None:
+            found, result = self.disk_cache.get(cache_key)
+        if not found:
+            start = time.perf_counter()
+            result = self.func(obj, *args)
+            elapsed = time.perf_counter() - start
+            if self.disk_cache is not None:
+                self.disk_cache.put(cache_key, result)
+
+        with self.lock:
+            if found:
+                self.disk_hits += 1
+            else:
+                self.num_computed += 1
+                self.compute_time += elapsed
+            if cache_key not in self.cache_dict:
+                self._put(cache_key, result)
+                if self.recorded is not None:
+                    self.recorded.append((cache_key, result))
         return result
 
 
-def abl_cache():
+class LogicForwardCache(Cache[K, T]):
+    """
+    A cache of ``logic_forward``, keyed by the pseudo-labels (and by ``x`` if
+    ``logic_forward`` takes it), so that reasoning results of the same pseudo-labels are
+    shared by all call sites, e.g. abduction and evaluation. It is enabled and bounded by
+    the object's ``use_forward_cache`` and ``forward_cache_size``, and has no persistent tier.
+
+    Parameters
+    ----------
+    func : Callable[[K], T]
+        The function to be cached.
+    """
+
+    enable_attr = "use_forward_cache"
+    size_attr = "forward_cache_size"
+
+    def _make_key(self, args: tuple) -> Any:
+        pseudo_label, *res_args = args
+        cache_key = (self.key_func(pseudo_label),)
+        if self.x_key_func is not None and len(res_args) > 0:
+            cache_key += (self.x_key_func(res_args[0]),)
+        return cache_key
+
+
+class RevisionLevelCache(Cache[K, T]):
+    """
+    A cache of the candidates found at each revision level, keyed like ``Cache``. It is
+    enabled and bounded by the object's ``use_level_cache`` and ``level_cache_size``, so that
+    it does not take slots of the main cache, and has no persistent tier.
+
+    Parameters
+    ----------
+    func : Callable[[K], T]
+        The function to be cached.
     """
-    Decorator to enable caching for a function.
+
+    enable_attr = "use_level_cache"
+    size_attr = "level_cache_size"
+
+
+def get_cache(obj: Any, func: Callable, cache_class: type = Cache) -> Cache:
+    """
+    Get the cache of ``func`` owned by ``obj``, creating it upon first access.
+
+    Parameters
+    ----------
+    obj : Any
+        The object to which the cached method belongs.
+    func : Callable
+        The (undecorated) cached method.
+    cache_class : type, optional
+        The class of the cache to create. Defaults to ``Cache``.
+
+    Returns
+    -------
+    Cache
+        The cache of ``func`` owned by ``obj``.
+    """
+    caches = obj.__dict__.get("_abl_caches")
+    cache_instance = caches.get(func.__name__) if caches is not None else None
+    if cache_instance is None:
+        with _cache_init_lock:
+            caches = obj.__dict__.setdefault("_abl_caches", {})
+            cache_instance = caches.get(func.__name__)
+            if cache_instance is None:
+                cache_instance = cache_class(func)
+                cache_instance.init_cache(obj)
+                caches[func.__name__] = cache_instance
+    if cache_instance.func is None:  # restored from pickle
+        cache_instance.func = func
+    return cache_instance
+
+
+def export_caches(obj: Any) -> Dict[str, List[Tuple[Any, Any]]]:
+    """
+    Export the entries of all caches owned by ``obj``.
+
+    Parameters
+    ----------
+    obj : Any
+        The object owning the caches.
+
+    Returns
+    -------
+    Dict[str, List[Tuple[Any, Any]]]
+        A mapping from the name of each cached method to the entries of its cache.
+    """
+    caches = obj.__dict__.get("_abl_caches", {})
+    return {name: cache_instance.export_cache() for name, cache_instance in caches.items()}
+
+
+def import_caches(obj: Any, cache_entries: Dict[str, List[Tuple[Any, Any]]]):
+    """
+    Import entries, as returned by ``export_caches``, into the caches owned by ``obj``.
+    Entries of caches that are disabled on ``obj`` are skipped.
+
+    Parameters
+    ----------
+    obj : Any
+        The object owning the caches.
+    cache_entries : Dict[str, List[Tuple[Any, Any]]]
+        A mapping from the name of each cached method to the entries to import.
+    """
+    for name, entries in cache_entries.items():
+        method = getattr(type(obj), name)
+        if getattr(obj, method.cache_class.enable_attr):
+            get_cache(obj, method.__wrapped__, method.cache_class).import_cache(entries)
+
+
+def record_caches(obj: Any) -> Dict[str, List[Tuple[Any, Any]]]:
+    """
+    Take the entries put into the enabled caches owned by ``obj`` by lookups (i.e., computed
+    or read from the persistent tier) since the last call, and keep recording those put from
+    now on. Caches not accessed yet are created, so that they are recorded as well. This is
+    used to send back only the entries added in a worker process.
+
+    Parameters
+    ----------
+    obj : Any
+        The object owning the caches.
+
+    Returns
+    -------
+    Dict[str, List[Tuple[Any, Any]]]
+        A mapping from the name of each cached method to the entries recorded since the last
+        call, in the format of ``export_caches``.
+    """
+    recorded = {}
+    for name in dir(type(obj)):
+        method = getattr(type(obj), name, None)
+        cache_class = getattr(method, "cache_class", None)
+        if cache_class is None or not getattr(obj, cache_class.enable_attr):
+            continue
+        cache_instance = get_cache(obj, method.__wrapped__, cache_class)
+        with cache_instance.lock:
+            if cache_instance.recorded:
+                recorded[name] = cache_instance.recorded
+            cache_instance.recorded = []
+    return recorded
+
+
+def cache_infos(obj: Any) -> Dict[str, CacheInfo]:
+    """
+    Report the statistics of all caches owned by ``obj``.
+
+    Parameters
+    ----------
+    obj : Any
+        The object owning the caches.
+
+    Returns
+    -------
+    Dict[str, CacheInfo]
+        A mapping from the name of each cached method to the statistics of its cache.
+    """
+    caches = obj.__dict__.get("_abl_caches", {})
+    return {name: cache_instance.cache_info() for name, cache_instance in caches.items()}
+
+
+def clear_caches(obj: Any):
+    """
+    Invalidate all caches owned by ``obj``, and reset their statistics.
+
+    Parameters
+    ----------
+    obj : Any
+        The object owning the caches.
+    """
+    for cache_instance in obj.__dict__.get("_abl_caches", {}).values():
+        cache_instance.clear_cache()
+
+
+def flush_caches(obj: Any):
+    """
+    Block until the queued writes of the persistent tiers of all caches owned by ``obj``
+    are committed, e.g. before a worker process returns its results and may be terminated.
+
+    Parameters
+    ----------
+    obj : Any
+        The object owning the caches.
+    """
+    for cache_instance in obj.__dict__.get("_abl_caches", {}).values():
+        if cache_instance.disk_cache is not None:
+            cache_instance.disk_cache.flush()
+
+
+def abl_cache(cache_class: type = Cache):
+    """
+    Decorator to enable caching for a method. Each object owns its own cache of the
+    method, which is configured by the object's ``key_func``, ``x_key_func`` (if any)
+    and ``cache_size`` upon first access.
+
+    Parameters
+    ----------
+    cache_class : type, optional
+        The class of the cache, which determines the cache key, and the attributes of
+        the object enabling and bounding the cache. Defaults to ``Cache``.
 
     Returns
     -------
@@ -149,14 +702,13 @@ def abl_cache():
     """
 
     def decorator(func):
-        cache_instance = Cache(func)
-
+        @wraps(func)
         def wrapper(obj, *args):
-            if obj.use_cache:
-                cache_instance.init_cache(obj)
-                return cache_instance.get_from_dict(obj, *args)
+            if getattr(obj, cache_class.enable_attr):
+                return get_cache(obj, func, cache_class).get_from_dict(obj, *args)
             return func(obj, *args)
 
+        wrapper.cache_class = cache_class
         return wrapper
 
     return decorator
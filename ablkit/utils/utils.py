@@ -93,7 +93,9 @@ def hamming_dist(pred_pseudo_label: List[Any], candidates: List[List[Any]]) -> n
     return np.sum(pred_pseudo_label != candidates, axis=1)
 
 
-def confidence_dist(pred_prob: np.ndarray, candidates_idxs: List[List[Any]]) -> np.ndarray:
+def confidence_dist(
+    pred_prob: np.ndarray, candidates_idxs: Union[List[List[Any]], np.ndarray]
+) -> np.ndarray:
     """
     Compute the confidence distance between prediction probabilities and candidates,
     where the confidence distance is defined as 1 - the product of prediction probabilities.
@@ -103,7 +105,7 @@ def confidence_dist(pred_prob: np.ndarray, candidates_idxs: List[List[Any]]) ->
     pred_prob : np.ndarray
         Prediction probability distributions, each element is an array
         representing the probability distribution of a particular prediction.
-    candidates_idxs : List[List[Any]]
+    candidates_idxs : Union[List[List[Any]], np.ndarray]
         Multiple possible candidates' indices.
 
     Returns
@@ -116,7 +118,72 @@ def confidence_dist(pred_prob: np.ndarray, candidates_idxs: List[List[Any]]) ->
     return 1 - np.prod(pred_prob[cols, candidates_idxs], axis=1)
 
 
-def avg_confidence_dist(pred_prob: np.ndarray, candidates_idxs: List[List[Any]]) -> np.ndarray:
+def _gather_prob(
+    pred_prob: np.ndarray,
+    candidates_idxs: Union[List[List[Any]], np.ndarray],
+    example_ids: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Gather the probabilities of the labels of each candidate, of shape
+    ``(candidate_num, symbol_num)``. If ``example_ids`` is provided, ``pred_prob`` stacks the
+    probabilities of several examples, and the i-th candidate belongs to the example
+    ``example_ids[i]``.
+    """
+    cols = np.arange(len(candidates_idxs[0]))[None, :]
+    if example_ids is None:
+        return pred_prob[cols, candidates_idxs]
+    return pred_prob[np.asarray(example_ids)[:, None], cols, candidates_idxs]
+
+
+def log_confidence_dist(
+    pred_prob: np.ndarray,
+    candidates_idxs: Union[List[List[Any]], np.ndarray],
+    example_ids: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Compute the confidence distance in log space, i.e., the negative log of the product of
+    prediction probabilities (clipped to [1e-9, 1]), which is the sum of their negative logs.
+    It ranks candidates in the same order as ``confidence_dist``, but does not underflow when
+    the product is tiny (e.g., for long examples), so that candidates stay distinguishable.
+
+    It also has a batched form: ``pred_prob`` of shape ``(..., symbol_num, class_num)`` and
+    ``candidates_idxs`` of shape ``(..., candidate_num, symbol_num)`` give distances of
+    shape ``(..., candidate_num)``, e.g., for many examples of the same length at once.
+    For examples with different numbers of candidates, their candidates can instead be
+    concatenated, with ``example_ids`` telling the example of each candidate.
+
+    Parameters
+    ----------
+    pred_prob : np.ndarray
+        Prediction probability distributions, each element is an array
+        representing the probability distribution of a particular prediction.
+    candidates_idxs : Union[List[List[Any]], np.ndarray]
+        Multiple possible candidates' indices, as a nested list or an integer matrix.
+    example_ids : np.ndarray, optional
+        If provided, ``pred_prob`` is of shape ``(example_num, symbol_num, class_num)``,
+        and the i-th candidate is compared with the example ``example_ids[i]``.
+        Defaults to None.
+
+    Returns
+    -------
+    np.ndarray
+        Log-space confidence distances computed for each candidate.
+    """
+    neg_log_prob = -np.log(np.clip(np.asarray(pred_prob, dtype=float), 1e-9, 1))
+    candidates_idxs = np.asarray(candidates_idxs, dtype=np.intp)
+    if example_ids is not None:
+        return _gather_prob(neg_log_prob, candidates_idxs, example_ids).sum(axis=1)
+    gathered = np.take_along_axis(
+        neg_log_prob[..., None, :, :], candidates_idxs[..., None], axis=-1
+    )
+    return gathered[..., 0].sum(axis=-1)
+
+
+def avg_confidence_dist(
+    pred_prob: np.ndarray,
+    candidates_idxs: Union[List[List[Any]], np.ndarray],
+    example_ids: Optional[np.ndarray] = None,
+) -> np.ndarray:
     """
     Compute the average confidence distance between prediction probabilities and candidates,
     where the confidence distance is defined as 1 - the average of prediction probabilities.
@@ -126,16 +193,19 @@ def avg_confidence_dist(pred_prob: np.ndarray, candidates_idxs: List[List[Any]])
     pred_prob : np.ndarray
         Prediction probability distributions, each element is an array
         representing the probability distribution of a particular prediction.
-    candidates_idxs : List[List[Any]]
+    candidates_idxs : Union[List[List[Any]], np.ndarray]
         Multiple possible candidates' indices.
+    example_ids : np.ndarray, optional
+        If provided, ``pred_prob`` is of shape ``(example_num, symbol_num, class_num)``,
+        and the i-th candidate is compared with the example ``example_ids[i]``.
+        Defaults to None.
 
     Returns
     -------
     np.ndarray
         Confidence distances computed for each candidate.
     """
-    cols = np.arange(len(candidates_idxs[0]))[None, :]
-    return 1 - np.average(pred_prob[cols, candidates_idxs], axis=1)
+    return 1 - np.average(_gather_prob(pred_prob, candidates_idxs, example_ids), axis=1)
 
 
 def to_hashable(x: Union[List[Any], Any]) -> Union[Tuple[Any, ...], Any]:
@@ -49,6 +49,12 @@ class HwfGroundKB(GroundKB):
     ):
         super().__init__(pseudo_label_list, GKB_len_list, max_err)
 
+    # Only enumerate formulas with digits on even positions and operators on odd positions
+    def allowed_labels(self, length, idx):
+        if length % 2 == 0:
+            return []
+        return self.pseudo_label_list[:9] if idx % 2 == 0 else self.pseudo_label_list[9:]
+
     def _valid_candidate(self, formula):
         if len(formula) % 2 == 0:
             return False
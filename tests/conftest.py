@@ -41,6 +41,24 @@ class LeNet5(nn.Module):
         return x
 
 
+class RecordingModel:
+    """A base model predicting each input as its own label, which records its calls."""
+
+    def __init__(self):
+        self.version = 0
+        self.predictions = []
+        self.fits = []
+
+    def predict(self, X):
+        self.predictions.append((self.version, list(X)))
+        return np.array(X)
+
+    def fit(self, X, y):
+        self.fits.append((list(X), list(y)))
+        self.version += 1
+        return 0.0
+
+
 # Fixture for BasicNN instance
 @pytest.fixture
 def basic_nn_instance():
@@ -106,16 +124,31 @@ def data_examples_hwf():
 
 
 class AddKB(KBBase):
-    def __init__(self, pseudo_label_list=list(range(10)), use_cache=False):
-        super().__init__(pseudo_label_list, use_cache=use_cache)
+    def __init__(self, pseudo_label_list=list(range(10)), use_cache=False, **kwargs):
+        super().__init__(pseudo_label_list, use_cache=use_cache, **kwargs)
 
     def logic_forward(self, nums):
         return sum(nums)
 
 
+class AddOffsetKB(AddKB):
+    def logic_forward(self, nums, x):
+        return sum(nums) + x[0]
+
+
+class AddBatchKB(AddKB):
+    def logic_forward_batch(self, candidates):
+        return candidates.sum(axis=1)
+
+
+class AddPruneKB(AddKB):
+    def prune_prefix(self, prefix, y):
+        return sum(prefix) > y
+
+
 class AddGroundKB(GroundKB):
-    def __init__(self, pseudo_label_list=list(range(10)), GKB_len_list=[2]):
-        super().__init__(pseudo_label_list, GKB_len_list)
+    def __init__(self, pseudo_label_list=list(range(10)), GKB_len_list=[2], **kwargs):
+        super().__init__(pseudo_label_list, GKB_len_list, **kwargs)
 
     def logic_forward(self, nums):
         return sum(nums)
@@ -193,6 +226,16 @@ def kb_add_cache():
     return AddKB(use_cache=True)
 
 
+@pytest.fixture
+def kb_add_batch():
+    return AddBatchKB()
+
+
+@pytest.fixture
+def kb_add_prune():
+    return AddPruneKB()
+
+
 @pytest.fixture
 def kb_add_ground():
     return AddGroundKB()
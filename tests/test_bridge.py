@@ -0,0 +1,113 @@
+import pytest
+
+from ablkit.bridge import SimpleBridge
+from ablkit.data.structures import ListData
+from ablkit.learning import ABLModel
+from ablkit.reasoning import Reasoner
+
+from conftest import AddKB, RecordingModel
+
+
+def make_bridge(bridge_class=SimpleBridge):
+    model = ABLModel(RecordingModel())
+    reasoner = Reasoner(AddKB(), "hamming")
+    return bridge_class(model, reasoner, [])
+
+
+def make_train_data():
+    X = [[1, 2], [3, 4], [5, 1], [2, 2], [0, 7]]
+    return X, X, [sum(x) for x in X]
+
+
+class TestPipelinedTrain(object):
+    def test_pipeline_matches_serial(self):
+        serial = make_bridge()
+        serial.train(make_train_data(), loops=2, segment_size=2)
+        pipelined = make_bridge()
+        pipelined.train(make_train_data(), loops=2, segment_size=2, pipeline=True)
+        assert pipelined.model.base_model.fits == serial.model.base_model.fits
+        assert [X for X, _ in pipelined.model.base_model.fits[:3]] == [
+            [1, 2, 3, 4],
+            [5, 1, 2, 2],
+            [0, 7],
+        ]
+
+    @pytest.mark.parametrize(
+        "max_staleness, versions",
+        [(1, [0, 0, 1, 2, 3]), (2, [0, 0, 0, 1, 2]), (4, [0, 0, 0, 0, 0])],
+    )
+    def test_pipeline_staleness(self, max_staleness, versions):
+        bridge = make_bridge()
+        bridge.train(
+            make_train_data(), loops=1, segment_size=1, pipeline=True, max_staleness=max_staleness
+        )
+        base_model = bridge.model.base_model
+        # The last prediction is made by the validation after the loop.
+        segment_predictions = base_model.predictions[:-1]
+        assert [version for version, _ in segment_predictions] == versions
+        assert [X for _, X in segment_predictions] == make_train_data()[0]
+        assert [X for X, _ in base_model.fits] == make_train_data()[0]
+        assert base_model.predictions[-1][0] == 5
+
+    def test_pipeline_serial_staleness(self):
+        bridge = make_bridge()
+        bridge.train(make_train_data(), loops=1, segment_size=1)
+        versions = [version for version, _ in bridge.model.base_model.predictions[:-1]]
+        assert versions == [0, 1, 2, 3, 4]
+
+    def test_pipeline_abduction_error(self):
+        bridge = make_bridge()
+        abduce_pseudo_label = bridge.abduce_pseudo_label
+
+        def failing_abduce_pseudo_label(data_examples):
+            if data_examples.X == [[5, 1]]:
+                raise RuntimeError("abduction failed")
+            return abduce_pseudo_label(data_examples)
+
+        bridge.abduce_pseudo_label = failing_abduce_pseudo_label
+        with pytest.raises(RuntimeError, match="abduction failed"):
+            bridge.train(make_train_data(), loops=1, segment_size=1, pipeline=True)
+        assert [X for X, _ in bridge.model.base_model.fits] == [[1, 2], [3, 4]]
+
+    @pytest.mark.parametrize("max_staleness", [0, -1, 1.0, None])
+    def test_pipeline_max_staleness(self, max_staleness):
+        bridge = make_bridge()
+        with pytest.raises(ValueError):
+            bridge.train(make_train_data(), pipeline=True, max_staleness=max_staleness)
+        assert bridge.model.base_model.fits == []
+        bridge.train(make_train_data(), loops=1, max_staleness=max_staleness)
+        assert len(bridge.model.base_model.fits) == 1
+
+
+class ConcatBridge(SimpleBridge):
+    def concat_data_examples(self, unlabel_data_examples, label_data_examples):
+        return super().concat_data_examples(unlabel_data_examples, label_data_examples)
+
+
+class TestTrainSegment(object):
+    @pytest.mark.parametrize("bridge_class", [SimpleBridge, ConcatBridge])
+    @pytest.mark.parametrize("pipeline", [False, True])
+    def test_train_with_label_data(self, bridge_class, pipeline):
+        label_X = [[9, 0], [4, 4]]
+        label_data = ListData(X=label_X, gt_pseudo_label=[[9, 0], [4, 4]], Y=[9, 8])
+        bridge = make_bridge(bridge_class)
+        bridge.train(make_train_data(), label_data, loops=2, segment_size=2, pipeline=pipeline)
+        X = make_train_data()[0]
+        segments = [X[0:2], X[2:4], X[4:5]] * 2
+        expected = [(sum(seg + label_X, []), sum(seg + label_X, [])) for seg in segments]
+        assert bridge.model.base_model.fits == expected
+        assert label_data.X == label_X and len(label_data) == 2
+        assert set(label_data.all_keys()) == {"X", "gt_pseudo_label", "Y"}
+
+    def test_segment_view(self):
+        bridge = make_bridge()
+        X, gt_pseudo_label, Y = make_train_data()
+        data_examples = ListData(X=X, gt_pseudo_label=gt_pseudo_label, Y=Y)
+        bridge._valid(data_examples)
+        assert hasattr(data_examples, "pred_idx")
+        segment = bridge._segment_view(data_examples, 1, 3)
+        assert set(segment.all_keys()) == {"X", "gt_pseudo_label", "Y"}
+        assert segment.X == X[1:3] and segment.Y == Y[1:3]
+        segment = bridge._segment_view(data_examples, 0, 5)
+        assert segment.X is X and segment.Y is Y
+        assert not hasattr(segment, "pred_idx")
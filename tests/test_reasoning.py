@@ -1,8 +1,17 @@
 import numpy as np
+import pickle
 import platform
 import pytest
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 
+from ablkit.data.evaluation import ReasoningMetric
+from ablkit.data.structures import ListData
 from ablkit.reasoning import PrologKB, Reasoner
+from ablkit.reasoning.reasoner import _abduce_shard_in_worker, _init_abduce_worker
+from ablkit.utils import avg_confidence_dist, confidence_dist, get_cache, log_confidence_dist
+
+from conftest import AddBatchKB, AddGroundKB, AddKB, AddOffsetKB
 
 
 class TestKBBase(object):
@@ -13,6 +22,131 @@ class TestKBBase(object):
         assert kb_add_cache.pseudo_label_list == list(range(10))
         assert kb_add_cache.use_cache is True
 
+    def test_cache_per_instance(self, kb_add_cache):
+        kb_add_cache.abduce_candidates([1, 2], 1, None, max_revision_num=2, require_more_revision=0)
+        kb_other = AddKB(use_cache=True)
+        assert kb_other.export_cache() == {}
+        assert len(kb_add_cache.export_cache()["_abduce_by_search"]) == 1
+
+        kb_copy = pickle.loads(pickle.dumps(kb_add_cache))
+        assert kb_copy.export_cache() == kb_add_cache.export_cache()
+        result = kb_copy.abduce_candidates(
+            [1, 2], 1, None, max_revision_num=2, require_more_revision=0
+        )
+        assert result == ([[1, 0]], [1])
+        assert get_cache(kb_copy, AddKB._abduce_by_search.__wrapped__).hits == 1
+
+        kb_other.import_cache(kb_add_cache.export_cache())
+        assert kb_other.export_cache() == kb_add_cache.export_cache()
+
+    def test_cache_threads(self, kb_add_cache):
+        def abduce(y):
+            return kb_add_cache.abduce_candidates(
+                [1, 2], y % 5, None, max_revision_num=2, require_more_revision=0
+            )
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(abduce, range(40)))
+        assert results == [abduce(y) for y in range(40)]
+        assert len(kb_add_cache.export_cache()["_abduce_by_search"]) == 5
+
+    def test_cache_info(self):
+        kb = AddKB(use_cache=True, cache_size=2)
+        for y in [1, 2, 1, 3, 4]:
+            kb.abduce_candidates([1, 2], y, None, max_revision_num=2, require_more_revision=0)
+        info = kb.cache_info()["_abduce_by_search"]
+        assert (info.hits, info.misses, info.evictions) == (1, 4, 2)
+        assert (info.size, info.max_size) == (2, 2)
+        assert info.bytes > 0 and info.time_saved >= 0
+
+        kb.clear_cache()
+        info = kb.cache_info()["_abduce_by_search"]
+        assert (info.hits, info.misses, info.size) == (0, 0, 0)
+        kb.abduce_candidates([1, 2], 1, None, max_revision_num=2, require_more_revision=0)
+        assert kb.cache_info()["_abduce_by_search"].size == 1
+
+    def test_cache_with_x(self):
+        assert not AddOffsetKB(use_cache=True).use_cache
+        kb = AddOffsetKB(use_cache=True, x_key_func=tuple)
+        assert kb.use_cache
+        results = [
+            kb.abduce_candidates([1, 2], 4, x, max_revision_num=1, require_more_revision=0)
+            for x in [[1], [2], [1]]
+        ]
+        assert results[0] == results[2] == ([[1, 2]], [4])
+        assert results[1] == ([[0, 2], [1, 1]], [4, 4])
+        info = kb.cache_info()["_abduce_by_search"]
+        assert (info.hits, info.misses) == (1, 2)
+
+    def test_revision_by_level(self):
+        kb = AddKB(use_cache=True, use_level_cache=True, level_cache_size=8)
+        kb.abduce_candidates([1, 2], 4, None, max_revision_num=2, require_more_revision=0)
+        result = kb.abduce_candidates([1, 2], 4, None, max_revision_num=2, require_more_revision=1)
+        assert len(result[0]) == 7
+        info = kb.cache_info()["_revision_by_level"]
+        assert (info.hits, info.misses, info.max_size) == (2, 3, 8)
+        kb_default = AddKB(use_cache=True)
+        kb_default.abduce_candidates([1, 2], 4, None, max_revision_num=2, require_more_revision=0)
+        assert "_revision_by_level" not in kb_default.cache_info()
+        assert kb_default.cache_info()["_abduce_by_search"].size == 1
+
+    def test_cached_logic_forward(self):
+        kb = AddKB(use_forward_cache=True)
+        kb.abduce_candidates([1, 2], 4, None, max_revision_num=1, require_more_revision=0)
+        info = kb.cache_info()["_logic_forward_memo"]
+        assert (info.hits, info.misses) == (2, 19)
+
+        metric = ReasoningMetric(kb)
+        metric.process(ListData(pred_pseudo_label=[[1, 3], [5, 5]], Y=[4, 4], X=[None, None]))
+        assert metric.compute_metrics()["reasoning_accuracy"] == 0.5
+        info = kb.cache_info()["_logic_forward_memo"]
+        assert (info.hits, info.misses) == (3, 20)
+
+        kb_off = AddKB()
+        kb_off.abduce_candidates([1, 2], 4, None, max_revision_num=1, require_more_revision=0)
+        assert kb_off.cache_info() == {}
+
+    def test_disk_cache(self, tmp_path):
+        cache_file = str(tmp_path / "abl_cache.db")
+        kb1 = AddKB(use_cache=True, cache_file=cache_file, cache_file_size=3)
+        for y in range(5):
+            kb1.abduce_candidates([1, 2], y, None, max_revision_num=2, require_more_revision=0)
+        get_cache(kb1, AddKB._abduce_by_search.__wrapped__).disk_cache.flush()
+
+        kb2 = AddKB(use_cache=True, cache_file=cache_file, cache_file_size=3)
+        kb2.logic_forward = None  # results must now be read from the cache file
+        for y in range(2, 5):
+            result = kb2.abduce_candidates(
+                [1, 2], y, None, max_revision_num=2, require_more_revision=0
+            )
+            assert result == kb1.abduce_candidates(
+                [1, 2], y, None, max_revision_num=2, require_more_revision=0
+            )
+        with pytest.raises(TypeError):
+            kb2.abduce_candidates([1, 2], 0, None, max_revision_num=2, require_more_revision=0)
+
+    def test_disk_cache_write_error(self, tmp_path):
+        cache_file = str(tmp_path / "abl_cache.db")
+        kb = AddKB(use_cache=True, cache_file=cache_file)
+        kb.abduce_candidates([1, 2], 1, None, max_revision_num=2, require_more_revision=0)
+        disk_cache = get_cache(kb, AddKB._abduce_by_search.__wrapped__).disk_cache
+        pickle.dumps(kb)  # flush the writes of all caches
+        conn = sqlite3.connect(cache_file)
+        num_rows = conn.execute("SELECT COUNT(*) FROM abl_cache").fetchone()
+        conn.execute(
+            "CREATE TRIGGER abort_insert BEFORE INSERT ON abl_cache "
+            "BEGIN SELECT RAISE(ABORT, 'read-only'); END"
+        )
+        conn.commit()
+        for y in [2, 3]:
+            kb.abduce_candidates([1, 2], y, None, max_revision_num=2, require_more_revision=0)
+            disk_cache.flush()
+        # The writer keeps consuming the queue, so pickling (which flushes) does not block.
+        kb_copy = pickle.loads(pickle.dumps(kb))
+        assert kb_copy.export_cache() == kb.export_cache()
+        disk_cache.close()
+        assert conn.execute("SELECT COUNT(*) FROM abl_cache").fetchone() == num_rows
+
     def test_logic_forward(self, kb_add):
         result = kb_add.logic_forward([1, 2])
         assert result == 3
@@ -27,6 +161,38 @@ class TestKBBase(object):
         result = kb_add.revise_at_idx([1, 2], 2, [0.1, -0.2, 0.2, -0.3], [0, 1])
         assert result == ([[0, 2], [1, 1], [2, 0]], [2, 2, 2])
 
+    def test_revise_at_idx_batch(self, kb_add, kb_add_batch):
+        kb_add_small_batch = AddBatchKB(forward_batch_size=7)
+        for pseudo_label, y, revision_idx in [
+            ([0, 2], 2, []),
+            ([1, 2], 2, []),
+            ([1, 2], 2, [0, 1]),
+            ([3, 4], 9, (1,)),
+            ([1, 2, 3], 12, [0, 1, 2]),
+        ]:
+            expected = kb_add.revise_at_idx(pseudo_label, y, None, revision_idx)
+            assert kb_add_batch.revise_at_idx(pseudo_label, y, None, revision_idx) == expected
+            result = kb_add_small_batch.revise_at_idx(pseudo_label, y, None, revision_idx)
+            assert result == expected
+        with pytest.raises(ValueError):
+            AddBatchKB(forward_batch_size=0)
+
+    def test_revise_at_idx_pruned(self, kb_add, kb_add_prune):
+        for pseudo_label, y, revision_idx in [
+            ([0, 2], 2, []),
+            ([9, 2], 2, [1]),
+            ([1, 2, 3], 4, [0, 2]),
+            ([3, 4, 5], 9, (0, 1, 2)),
+        ]:
+            result = kb_add_prune.revise_at_idx(pseudo_label, y, None, revision_idx)
+            assert result == kb_add.revise_at_idx(pseudo_label, y, None, revision_idx)
+        result = kb_add_prune.abduce_candidates(
+            [9, 9, 9, 9], 3, None, max_revision_num=4, require_more_revision=0
+        )
+        assert result == kb_add.abduce_candidates(
+            [9, 9, 9, 9], 3, None, max_revision_num=4, require_more_revision=0
+        )
+
     def test_abduce_candidates(self, kb_add):
         result = kb_add.abduce_candidates(
             [0, 1], 1, [0.1, -0.2, 0.2, -0.3], max_revision_num=2, require_more_revision=0
@@ -53,6 +219,78 @@ class TestGroundKB(object):
             [1, 2], 1, [0.1, -0.2, 0.2, -0.3], max_revision_num=2, require_more_revision=0
         )
         assert result == ([(1, 0)], [1])
+        for y in [np.int64(1), np.float32(1.0)]:
+            result = kb_add_ground.abduce_candidates([1, 2], y, None, 2, 0)
+            assert result == ([(1, 0)], [1])
+        assert kb_add_ground.abduce_candidates([1, 2], True, None, 2, 0) == ([], [])
+
+    def test_chunked_GKB(self, kb_add_ground, tmp_path):
+        kb1 = AddGroundKB(GKB_len_list=[2], num_workers=1, chunk_size=7)
+        kb2 = AddGroundKB(GKB_len_list=[2], num_workers=3, chunk_size=7, GKB_dir=str(tmp_path))
+        for kb in [kb1, kb2]:
+            assert np.array_equal(kb.GKB[2][0], kb_add_ground.GKB[2][0])
+            assert np.array_equal(kb.GKB[2][1], kb_add_ground.GKB[2][1])
+        assert list(tmp_path.iterdir()) and all(p.is_file() for p in tmp_path.iterdir())
+
+    def test_GKB_workers(self, monkeypatch):
+        import ablkit.reasoning.kb as kb_module
+
+        processes_list = []
+
+        def pool(processes, **kwargs):
+            processes_list.append(processes)
+            raise RuntimeError("no pool")
+
+        monkeypatch.setattr(kb_module, "Pool", pool)
+        # 100 rows fit in one chunk, so no pool is started
+        kb = AddGroundKB(GKB_len_list=[2], num_workers=8)
+        assert len(kb.GKB[2][1]) == 100 and processes_list == []
+        with pytest.raises(RuntimeError):
+            AddGroundKB(GKB_len_list=[2], num_workers=8, chunk_size=40)
+        assert processes_list == [3]
+
+    def test_filtered_GKB(self):
+        class EvenFirstKB(AddGroundKB):
+            def logic_forward(self, nums):
+                return sum(nums) if nums[0] % 2 == 0 else None
+
+        class FilteredEvenFirstKB(EvenFirstKB):
+            def allowed_labels(self, length, idx):
+                return [0, 2, 4, 6, 8] if idx == 0 else self.pseudo_label_list
+
+        kb1 = EvenFirstKB(GKB_len_list=[2, 3], num_workers=1)
+        kb2 = FilteredEvenFirstKB(GKB_len_list=[2, 3], num_workers=1, chunk_size=9)
+        for length in [2, 3]:
+            assert np.array_equal(kb1.GKB[length][0], kb2.GKB[length][0])
+            assert np.array_equal(kb1.GKB[length][1], kb2.GKB[length][1])
+
+    def test_persisted_GKB(self, kb_add_ground, tmp_path, monkeypatch):
+        kb1 = AddGroundKB(GKB_len_list=[1, 2], GKB_dir=str(tmp_path))
+        assert len(list(tmp_path.glob("AddGroundKB_len2_*.npy"))) == 2
+        # the GKB must now be loaded without being rebuilt
+        monkeypatch.setattr(AddGroundKB, "_build_GKB", None)
+        kb2 = AddGroundKB(GKB_len_list=[1, 2], GKB_dir=str(tmp_path))
+        kb3 = AddGroundKB(GKB_len_list=[2], GKB_dir=str(tmp_path))
+        for kb in [kb1, kb2, kb3]:
+            assert np.array_equal(kb.GKB[2][0], kb_add_ground.GKB[2][0])
+            assert np.array_equal(kb.GKB[2][1], kb_add_ground.GKB[2][1])
+            result = kb.abduce_candidates(
+                [1, 2], 1, None, max_revision_num=2, require_more_revision=0
+            )
+            assert result == ([(1, 0)], [1])
+
+        data = pickle.dumps(kb2)
+        assert len(data) < len(pickle.dumps(kb_add_ground))
+        kb4 = pickle.loads(data)
+        assert isinstance(kb4.GKB[2][0], np.memmap)
+        assert np.array_equal(kb4.GKB[2][1], kb_add_ground.GKB[2][1])
+
+        # unpickling maps the persisted lengths only, and never builds the missing ones
+        for file in tmp_path.glob("AddGroundKB_len1_*.npy"):
+            file.unlink()
+        kb5 = pickle.loads(data)
+        assert list(kb5.GKB) == [2]
+        assert kb5.abduce_candidates([1], 1, None, 1, 0) == ([], [])
 
 
 class TestPrologKB(object):
@@ -106,6 +344,91 @@ class TestPrologKB(object):
         result = kb_add_prolog.revise_at_idx([1, 2], 2, [0.1, -0.2, 0.2, -0.3], [0])
         assert result == ([[0, 2]], [2])
 
+    def test_batch_revise_at_idx(self, kb_add_prolog):
+        if platform.system() == "Darwin":
+            return
+        revision_list = [([1, 2], 2, None, [0]), ([1, 2], 4, None, [1]), ([1, 2], 3, None, [0, 1])]
+        results = kb_add_prolog.batch_revise_at_idx(revision_list)
+        assert results == [kb_add_prolog.revise_at_idx(*revision) for revision in revision_list]
+
+        kb_add_prolog.batch_query = True
+        result = kb_add_prolog.abduce_candidates([1, 2], 4, None, 2, 0)
+        assert result == ([[2, 2], [1, 3]], [4, 4])
+
+    def test_batch_revise_at_idx_atoms(self, tmp_path):
+        if platform.system() == "Darwin":
+            return
+        pl_file = tmp_path / "calc.pl"
+        pl_file.write_text(
+            "digit(D) :- member(D, [1, 2, 3]).\n"
+            "logic_forward([A, Op, B], Res) :- digit(A), member(Op, ['+', '-']), digit(B), "
+            "T =.. [Op, A, B], Res is T.\n"
+        )
+        kb = PrologKB([1, 2, 3, "+", "-"], str(pl_file))
+        revision_list = [([1, "+", 2], 3, None, [1]), ([1, "-", 2], 4, None, [1, 2])]
+        results = kb.batch_revise_at_idx(revision_list)
+        assert results == [kb.revise_at_idx(*revision) for revision in revision_list]
+        assert results[0] == ([[1, "+", 2]], [3])
+        assert results[1] == ([[1, "+", 3]], [4])
+
+    def test_term_query(self, kb_add_prolog):
+        if platform.system() == "Darwin":
+            return
+        expected = kb_add_prolog.revise_at_idx([1, 2], 3, None, [0, 1])
+        kb_add_prolog.term_query = True
+        assert kb_add_prolog.revise_at_idx([1, 2], 3, None, [0, 1]) == expected
+        assert kb_add_prolog.revise_at_idx([1, 2], 2, None, [0]) == ([[0, 2]], [2])
+
+    def test_term_query_error(self, tmp_path):
+        if platform.system() == "Darwin":
+            return
+        from pyswip.prolog import PrologError
+
+        pl_file = tmp_path / "div.pl"
+        pl_file.write_text(
+            "logic_forward([A, B], Res) :- member(A, [0, 1, 2]), member(B, [0, 1, 2]), "
+            "Res is A // B.\n"
+        )
+        kb = PrologKB([0, 1, 2], str(pl_file), term_query=True)
+        assert kb.logic_forward([2, 1]) == 2
+        with pytest.raises(PrologError):
+            kb.logic_forward([1, 0])
+        with pytest.raises(PrologError):
+            kb.revise_at_idx([1, 1], 1, None, [1])
+        # the terms of each query are discarded, so repeated queries do not exhaust the stack
+        for _ in range(20000):
+            assert kb.revise_at_idx([2, 2], 1, None, [0]) == ([[2, 2]], [1])
+            assert kb.logic_forward([2, 2]) == 1
+
+    def test_logic_forward_fast_path(self):
+        if platform.system() == "Darwin":
+            return
+        kb = PrologKB(
+            list(range(10)),
+            "examples/mnist_add/add.pl",
+            term_query=True,
+            table_predicates=["logic_forward/2"],
+        )
+        assert kb.logic_forward([1, 2]) == 3
+        assert kb.logic_forward([1, 2]) == 3
+        assert kb.logic_forward([9, 9]) == 18
+
+    def test_prolog_workers(self, data_examples_add):
+        if platform.system() == "Darwin":
+            return
+        kb = PrologKB(list(range(10)), "examples/mnist_add/add.pl", num_workers=2)
+        try:
+            result = kb.abduce_candidates([1, 2], 4, None, 2, 0)
+            assert result == ([[2, 2], [1, 3]], [4, 4])
+            kb_copy = pickle.loads(pickle.dumps(kb))
+            assert kb_copy.logic_forward([1, 2]) == 3
+
+            # Within the (daemonic) workers of the reasoner, the embedded engine is used.
+            reasoner = Reasoner(kb, "confidence", max_revision=2, num_workers=2)
+            assert reasoner.batch_abduce(data_examples_add) == [[1, 7], [7, 1], [8, 9], [1, 9]]
+        finally:
+            kb.close()
+
 
 class TestReaonser(object):
     def test_reasoner_init(self, reasoner_instance):
@@ -149,6 +472,49 @@ class TestReaonser(object):
             in str(excinfo.value)
         )
 
+    def test_log_confidence_dist(self, kb_add):
+        reasoner = Reasoner(kb_add, "confidence")
+        candidates = [[1, 7], [7, 1]]
+        candidates_idxs = reasoner._get_candidates_idxs(candidates)
+        assert candidates_idxs.tolist() == candidates
+
+        # The products underflow to 0, but the log-space costs still rank the candidates.
+        pred_prob = np.full((400, 10), 0.01)
+        pred_prob[:, 1] = 0.5
+        candidates_idxs = np.array([[1] * 400, [1] * 399 + [7]])
+        assert np.all(confidence_dist(pred_prob, candidates_idxs) == 1)
+        costs = log_confidence_dist(pred_prob, candidates_idxs)
+        assert costs[0] < costs[1]
+
+        batched = log_confidence_dist(np.stack([pred_prob] * 3), np.stack([candidates_idxs] * 3))
+        assert batched.shape == (3, 2)
+        assert np.allclose(batched, costs)
+
+        # candidates of several examples, concatenated with the example of each candidate
+        rng = np.random.default_rng(0)
+        pred_prob = rng.dirichlet(np.ones(10), size=(2, 3))
+        candidates_idxs = rng.integers(0, 10, size=(5, 3))
+        example_ids = np.array([0, 0, 1, 1, 1])
+        for dist in [log_confidence_dist, avg_confidence_dist]:
+            expected = np.concatenate(
+                [dist(pred_prob[0], candidates_idxs[:2]), dist(pred_prob[1], candidates_idxs[2:])]
+            )
+            assert np.allclose(dist(pred_prob, candidates_idxs, example_ids), expected)
+
+    def test_custom_cost_list(self, kb_add):
+        class ReversedReasoner(Reasoner):
+            def _get_cost_list(self, data_example, candidates, reasoning_results):
+                return -super()._get_cost_list(data_example, candidates, reasoning_results)
+
+        pred_prob = np.full((2, 10), 0.01)
+        pred_prob[0, 1] = pred_prob[1, 7] = 0.9
+        data_example = ListData(pred_prob=pred_prob)
+        candidates = [[1, 7], [7, 1]]
+        reasoner = Reasoner(kb_add, "confidence")
+        assert reasoner._get_one_candidate(data_example, candidates, [8, 8]) == [1, 7]
+        reasoner = ReversedReasoner(kb_add, "confidence")
+        assert reasoner._get_one_candidate(data_example, candidates, [8, 8]) == [7, 1]
+
 
 class TestBatchAbduce(object):
     def test_batch_abduce_add(self, kb_add, data_examples_add):
@@ -171,6 +537,142 @@ class TestBatchAbduce(object):
             [7, 3],
         ]
 
+    def test_batch_abduce_parallel(self, kb_add, data_examples_add):
+        reasoner1 = Reasoner(kb_add, "confidence", max_revision=2, require_more_revision=1)
+        reasoner2 = Reasoner(
+            kb_add, "confidence", max_revision=2, require_more_revision=1, num_workers=3
+        )
+        assert reasoner2.batch_abduce(data_examples_add) == reasoner1.batch_abduce(
+            data_examples_add
+        )
+        assert data_examples_add.abduced_pseudo_label == [[1, 7], [7, 1], [8, 9], [7, 3]]
+        with pytest.raises(TypeError):
+            Reasoner(kb_add, "confidence", num_workers=1.5)
+
+    def test_batch_abduce_parallel_cache(self, kb_add_cache, data_examples_add):
+        reasoner = Reasoner(kb_add_cache, "confidence", max_revision=2, num_workers=2)
+        reasoner.batch_abduce(data_examples_add)
+        assert len(kb_add_cache.export_cache()["_abduce_by_search"]) == 3
+
+    def test_batch_abduce_parallel_pool(self, kb_add_cache, data_examples_add):
+        reasoner = Reasoner(kb_add_cache, "confidence", max_revision=2, num_workers=2)
+        try:
+            expected = reasoner.batch_abduce(data_examples_add)
+            pool = reasoner._pool
+            assert reasoner.batch_abduce(data_examples_add) == expected
+            assert reasoner._pool is pool
+            reasoner_copy = pickle.loads(pickle.dumps(reasoner))
+            assert reasoner_copy._pool is None
+        finally:
+            reasoner.close()
+        assert reasoner._pool is None
+
+        # a worker sends back only the entries added during each shard
+        reasoner = Reasoner(AddKB(use_cache=True), "confidence", max_revision=2)
+        _init_abduce_worker(reasoner)
+        _, (cache_entries, _, _) = _abduce_shard_in_worker(data_examples_add[:2])
+        assert len(cache_entries["_abduce_by_search"]) == 1
+        _, (cache_entries, _, _) = _abduce_shard_in_worker(data_examples_add)
+        assert len(cache_entries["_abduce_by_search"]) == 2
+        _, (cache_entries, _, _) = _abduce_shard_in_worker(data_examples_add)
+        assert cache_entries == {}
+
+    def test_batch_abduce_parallel_cache_file(self, tmp_path):
+        cache_file = str(tmp_path / "abl_cache.db")
+        kb = AddKB(use_cache=True, cache_file=cache_file)
+        data_examples = ListData()
+        data_examples.X = [None] * 40
+        data_examples.pred_pseudo_label = [[i % 10, i // 10] for i in range(40)]
+        data_examples.pred_prob = [np.full((2, 10), 0.1)] * 40
+        data_examples.Y = [1] * 40
+        reasoner = Reasoner(kb, "hamming", max_revision=2, num_workers=4)
+        reasoner.batch_abduce(data_examples)
+        kb.flush_cache()
+        conn = sqlite3.connect(cache_file)
+        namespace = get_cache(kb, AddKB._abduce_by_search.__wrapped__).disk_cache.namespace
+        count = conn.execute(
+            "SELECT COUNT(*) FROM abl_cache WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        assert count == (40,)
+
+    def test_batch_abduce_segment(self, kb_add):
+        rng = np.random.default_rng(0)
+        data_examples = ListData()
+        data_examples.X = [None] * 20
+        data_examples.pred_prob = [rng.dirichlet(np.ones(10), size=3) for _ in range(20)]
+        data_examples.pred_pseudo_label = [
+            prob.argmax(axis=1).tolist() for prob in data_examples.pred_prob
+        ]
+        data_examples.Y = rng.integers(0, 28, size=20).tolist()
+        for dist_func in ["hamming", "confidence", "avg_confidence"]:
+            reasoner = Reasoner(kb_add, dist_func, max_revision=2, require_more_revision=1)
+            assert reasoner._use_segment_cost()
+            expected = [reasoner.abduce(data_example) for data_example in data_examples]
+            assert reasoner.batch_abduce(data_examples) == expected
+
+    def test_batch_abduce_zoopt_seeded(self, kb_add, data_examples_add):
+        state = np.random.get_state()
+        reasoner = Reasoner(kb_add, "confidence", use_zoopt=True, max_revision=2, zoopt_seed=0)
+        expected = reasoner.batch_abduce(data_examples_add)
+        assert expected == [[1, 7], [7, 1], [8, 9], [7, 3]]
+        assert np.array_equal(np.random.get_state()[1], state[1])
+
+        reasoner.num_workers = 2
+        assert reasoner.batch_abduce(data_examples_add) == expected
+        assert reasoner.batch_abduce(data_examples_add[::-1]) == expected[::-1]
+
+    def test_batch_abduce_zoopt_memo(self, kb_add, data_examples_add):
+        class CountingReasoner(Reasoner):
+            masks = []
+
+            def zoopt_score(self, symbol_num, data_example, sol):
+                self.masks.append(tuple(sol.get_x()))
+                return super().zoopt_score(symbol_num, data_example, sol)
+
+        reasoner = CountingReasoner(
+            kb_add, "confidence", use_zoopt=True, max_revision=2, zoopt_warm_start=2
+        )
+        reasoner.abduce(data_examples_add[0])
+        assert len(reasoner.masks) == len(set(reasoner.masks))
+        assert len(reasoner._zoopt_masks) == 1
+        best_masks = next(iter(reasoner._zoopt_masks.values()))
+        assert len(best_masks) == 2
+
+        reasoner.masks.clear()
+        reasoner.abduce(data_examples_add[0])
+        assert set(best_masks) <= set(reasoner.masks)
+
+    def test_batch_abduce_zoopt_adaptive_budget(self, kb_add, data_examples_add):
+        reasoner1 = Reasoner(kb_add, "confidence", use_zoopt=True, zoopt_seed=0)
+        reasoner2 = Reasoner(
+            kb_add, "confidence", use_zoopt=True, zoopt_seed=0, zoopt_adaptive_budget=True
+        )
+        expected = [[1, 7], [7, 1], [8, 9], [7, 3]]
+        assert reasoner1.batch_abduce(data_examples_add) == expected
+        assert reasoner2.batch_abduce(data_examples_add) == expected
+        info1, info2 = reasoner1.zoopt_budget_info(), reasoner2.zoopt_budget_info(reset=True)
+        assert info1["budget"] == info2["budget"] == 80
+        assert info2["evaluations"] < info1["evaluations"]
+        assert info2["early_stops"] > 0
+        assert reasoner2.zoopt_budget_info()["optimizations"] == 0
+
+        # No compatible revision exists, so the budget is enlarged.
+        reasoner3 = Reasoner(
+            kb_add, "confidence", use_zoopt=True, max_revision=1, zoopt_adaptive_budget=True
+        )
+        assert reasoner3.batch_abduce(data_examples_add[2:3]) == [[]]
+        assert reasoner3.zoopt_budget_info()["evaluations"] > 20
+
+    def test_batch_abduce_best_first(self, kb_add, data_examples_add):
+        reasoner1 = Reasoner(kb_add, "confidence", max_revision=1, use_best_first=True)
+        reasoner2 = Reasoner(kb_add, "confidence", max_revision=2, use_best_first=True)
+        assert reasoner1.batch_abduce(data_examples_add) == [[1, 7], [7, 1], [], [1, 9]]
+        assert reasoner2.batch_abduce(data_examples_add) == [[1, 7], [7, 1], [8, 9], [7, 3]]
+        with pytest.raises(ValueError):
+            Reasoner(kb_add, "hamming", use_best_first=True)
+        with pytest.raises(ValueError):
+            Reasoner(kb_add, "confidence", use_zoopt=True, use_best_first=True)
+
     def test_batch_abduce_ground(self, kb_add_ground, data_examples_add):
         reasoner1 = Reasoner(kb_add_ground, "confidence", max_revision=1, require_more_revision=0)
         reasoner2 = Reasoner(kb_add_ground, "confidence", max_revision=1, require_more_revision=1)